@@ -0,0 +1,137 @@
+"""
+Agent Graph - SubAgent 依赖图 (agent_config.yaml -> agents.subagents)
+- 每个 SubAgent 声明读取的 AgentContext namespace (inputs) 与写入的 namespace (output)
+- A 读取 B 的 output 即依赖 B; 读取 risk_flags 的节点依赖所有不读取 risk_flags 的节点
+- 依赖全部结束 (完成/失败/跳过) 即可启动, 不再按阶段等待
+- 新 SubAgent 只需在配置中增加一项 (class 为 "模块.类名"), 无需修改 MasterAgent
+"""
+import importlib
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from config import load_agent_config
+
+
+RISK_FLAGS = "risk_flags"
+
+# 内置 SubAgent (配置中未写 class 时按 key 查找)
+BUILTIN_AGENTS = {
+    "parsing": "agents.subagents.FinancialParsingAgent",
+    "trend": "agents.subagents.TrendAnalysisAgent",
+    "sentiment": "agents.subagents.SentimentAgent",
+    "whale": "agents.subagents.WhaleBehaviorAgent",
+    "risk": "agents.subagents.RiskAssessmentAgent",
+    "synthesis": "agents.subagents.SynthesisAgent",
+}
+
+
+def load_class(path: str):
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+class AgentNode:
+    def __init__(self, name: str, inputs: Iterable[str] = (), output: Optional[str] = None,
+                 cls: Optional[str] = None):
+        self.name = name
+        self.inputs = list(inputs)
+        self.output = output
+        self.cls = cls or BUILTIN_AGENTS.get(name)
+        if not self.cls:
+            raise ValueError(f"subagent {name}: no class configured")
+    
+    def create(self, llm=None):
+        return load_class(self.cls)(llm)
+    
+    def __repr__(self):
+        return f"AgentNode({self.name}, inputs={self.inputs}, output={self.output})"
+
+
+class AgentGraph:
+    """SubAgent 依赖图 (构建时校验环与重复 output)"""
+    
+    def __init__(self, nodes: List[AgentNode], order: Optional[List[str]] = None):
+        self.nodes = {node.name: node for node in nodes}
+        self.dependencies = self._resolve()
+        self.order = self._topological(order or [])
+    
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> "AgentGraph":
+        config = config if config is not None else load_agent_config()
+        agents = config.get("agents", {}) or {}
+        nodes = [
+            AgentNode(name, spec.get("inputs", []), spec.get("output"), spec.get("class"))
+            for name, spec in (agents.get("subagents", {}) or {}).items()
+            if spec.get("enabled", True)
+        ]
+        return cls(nodes, agents.get("execution_order"))
+    
+    def _resolve(self) -> Dict[str, Set[str]]:
+        producers: Dict[str, str] = {}
+        for node in self.nodes.values():
+            if node.output is None:
+                continue
+            if node.output in producers or node.output == RISK_FLAGS:
+                raise ValueError(f"subagent {node.name}: output {node.output} already produced")
+            producers[node.output] = node.name
+        
+        flag_writers = {name for name, node in self.nodes.items() if RISK_FLAGS not in node.inputs}
+        dependencies = {}
+        for name, node in self.nodes.items():
+            deps = {producers[ns] for ns in node.inputs if ns in producers}
+            if RISK_FLAGS in node.inputs:
+                deps |= flag_writers
+            deps.discard(name)
+            dependencies[name] = deps
+        return dependencies
+    
+    def _topological(self, preferred: List[str]) -> List[str]:
+        """拓扑序; 同一层内按 execution_order 排列 (仅用于展示与调度先后)"""
+        rank = {name: i for i, name in enumerate(preferred)}
+        names = sorted(self.nodes, key=lambda n: rank.get(n, len(rank)))
+        order, done = [], set()
+        while len(order) < len(names):
+            ready = [n for n in names if n not in done and self.dependencies[n] <= done]
+            if not ready:
+                cycle = [n for n in names if n not in done]
+                raise ValueError(f"subagent dependency cycle: {cycle}")
+            order.extend(ready)
+            done.update(ready)
+        return order
+    
+    def ready(self, finished: Set[str], started: Set[str]) -> List[str]:
+        """依赖全部结束且尚未启动的节点 (按 order)"""
+        return [
+            name for name in self.order
+            if name not in finished and name not in started and self.dependencies[name] <= finished
+        ]
+    
+    def critical_path(self, durations: Dict[str, float]) -> Dict[str, Any]:
+        """按各节点实际耗时求最长依赖链 (关键路径)"""
+        best: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in self.order:
+            parent = max(self.dependencies[name], key=lambda d: best.get(d, 0.0), default=None)
+            best[name] = durations.get(name, 0.0) + (best.get(parent, 0.0) if parent else 0.0)
+            previous[name] = parent
+        if not best:
+            return {"path": [], "ms": 0}
+        name = max(best, key=best.get)
+        total = best[name]
+        path = []
+        while name:
+            path.append(name)
+            name = previous[name]
+        return {"path": path[::-1], "ms": int(total)}
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "inputs": self.nodes[name].inputs,
+                "output": self.nodes[name].output,
+                "depends_on": sorted(self.dependencies[name])
+            }
+            for name in self.order
+        }
+    
+    def __len__(self):
+        return len(self.nodes)
@@ -0,0 +1,95 @@
+"""
+Incremental - SubAgent 结果复用 (agent_config.yaml -> agents.incremental)
+- 每个 SubAgent 的最近一次结果连同输入指纹存入 SQLite, 按 (ticker, 季度, SubAgent) 各保留一条
+- 指纹 = 读取的 namespace 内容 + 版本 + 模型配置 + 行情快照时间 (market_cache.fetched_at)
+- 再次分析时指纹相同直接复用, 只有输入变化的 SubAgent 及受其影响的下游重新执行
+  (如期权快照更新: whale 重跑, synthesis 因 whale_activity 变化重跑, 其余复用)
+- 出错/超时/跳过的结果不保存
+"""
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from cache import DiskCache, MISSING, hit_rate
+from config import load_agent_config
+
+
+def load_incremental_config() -> Dict[str, Any]:
+    return load_agent_config().get("agents", {}).get("incremental", {}) or {}
+
+
+def fingerprint(agent: str, version: str, inputs: Dict[str, Any], snapshot: Dict[str, Any],
+                model: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps(
+        {"agent": agent, "version": version, "inputs": inputs, "data": snapshot, "model": model},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """SubAgent 结果存储 (SQLite, 多进程共享); tag 为 ticker, 便于按 ticker 失效"""
+    
+    def __init__(self, path: str, ttl_s: Optional[float] = 86400):
+        self.ttl_s = ttl_s
+        self.disk = DiskCache(path, table="subagent_results")
+        self._lock = threading.Lock()
+        self.stats = {"reused": 0, "misses": 0, "writes": 0}
+    
+    @staticmethod
+    def key(stock: str, quarter: str, agent: str) -> str:
+        return f"{stock.upper()}:{quarter}:{agent}"
+    
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+    
+    def get(self, stock: str, quarter: str, agent: str, fp: str) -> Optional[Dict[str, Any]]:
+        """指纹一致时返回保存的结果, 否则 None"""
+        entry = self.disk.get(self.key(stock, quarter, agent))
+        if entry is MISSING or entry["fingerprint"] != fp:
+            self._count("misses")
+            return None
+        self._count("reused")
+        return entry["result"]
+    
+    def put(self, stock: str, quarter: str, agent: str, fp: str, result: Dict[str, Any]):
+        self.disk.set(self.key(stock, quarter, agent), {"fingerprint": fp, "result": result},
+                      ttl_s=self.ttl_s, tag=stock.upper())
+        self._count("writes")
+    
+    def invalidate(self, stock: Optional[str] = None) -> int:
+        """按 ticker 失效, 不传则清空"""
+        if stock:
+            return self.disk.delete_tag(stock.upper())
+        removed = len(self.disk)
+        self.disk.clear()
+        return removed
+    
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "hit_rate": hit_rate(stats["reused"], stats["misses"]),
+            "entries": len(self.disk),
+            "path": self.disk.path,
+            "ttl_s": self.ttl_s
+        }
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """进程内共享的结果存储 (懒加载); 配置关闭时为 None"""
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                config = load_incremental_config()
+                enabled = config.get("enabled", True) and config.get("path")
+                _default_store = ResultStore(config["path"], config.get("ttl_s", 86400)) if enabled else False
+    return _default_store or None
@@ -1,138 +1,350 @@
 """
-MasterAgent - 完全并行版
+MasterAgent - 依赖图调度版 (asyncio)
 """
 import time
-import concurrent.futures
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, AsyncIterator, Set
 from memory import WorkingMemory
 from validator import OutputValidator
-from agents.subagents import (
-    FinancialParsingAgent,
-    TrendAnalysisAgent,
-    SentimentAgent,
-    WhaleBehaviorAgent,
-    RiskAssessmentAgent,
-    SynthesisAgent
-)
+from deadline import AnalysisBudget, Deadline
+from tracing import span, record_span, trace_context, current_trace_id
+from tokens import TokenBudget, load_token_config, tokenizer_name, TOKENS_TOTAL
+from agents.graph import AgentGraph
+from agents.incremental import ResultStore, fingerprint, get_result_store
 
 
 class MasterAgent:
     """
-    完全并行版 MasterAgent
-    - Phase 1: Parsing (串行，必须)
-    - Phase 2: 所有分析并行 (trend/sentiment/whale/risk)
-    - Phase 3: Synthesis (串行)
+    依赖图调度版 MasterAgent
+    - SubAgent 及其 inputs/output 来自 agent_config.yaml (agents/graph.py)
+    - 每个 SubAgent 在其依赖全部结束时立即启动: whale 与 parsing 同时开始,
+      trend/sentiment/risk 在 parsing 完成后开始, synthesis 等待全部
+    - 端到端延迟为关键路径延迟, final 中的 critical_path 给出实际关键路径
+
+    analyze_async 为主执行路径, 在事件循环内并发调度 SubAgent;
+    analyze 为同步封装, 供 Controller/Scheduler 等非异步调用方使用。
+
+    可重入: MasterAgent 与 SubAgent 均不保存单次分析的状态,
+    每次调用创建独立的 WorkingMemory 并显式传递, 同一实例可并发分析多只股票。
+    
+    超时: 每次分析有总预算 (agents.budget_ms), 按各 SubAgent 的 timeout_ms
+    拆分为截止时间; 超时的 SubAgent 会被取消并记为 timeout。
+    
+    流式: analyze_stream 在每个 SubAgent 完成时产出事件 (start/subagent/final),
+    analyze_async 只是消费该流并返回 final。
+    
+    追踪: 每次分析、每个 SubAgent 各记录一个 span, 共用调用方的 trace_id
+    (HTTP 请求由 main.py 中间件设置; 没有时 analyze_async 新建一个)。
+    
+    token: 每个 SubAgent 的 prompt/completion token 汇总为 total_tokens; 有 token 预算
+    (agents.tokens, 批量时为批量预算的子预算) 时, 可选 SubAgent 启动前预估其消耗与
+    尚未启动的必需 SubAgent 的消耗, 预算不足则跳过 (optional 中越靠前越先被跳过)。
+    
+    增量: 启用 agents.incremental 时, 每个 SubAgent 启动前按输入指纹查找上次的结果,
+    一致则直接复用 (不调用 LLM/行情接口, 不计 token), 只重新执行输入变化的 SubAgent;
+    下游的指纹包含上游输出, 上游结果不变时下游同样复用。
     """
     
+    # 配置缺少 execution_order 时的展示顺序
     EXECUTION_ORDER = ["parsing", "trend", "sentiment", "whale", "risk", "synthesis"]
+    FINAL_AGENT = "synthesis"
+    
+    # 预算不足时依次跳过 (agents.tokens.optional 可覆盖)
+    DEFAULT_OPTIONAL = ["sentiment", "risk", "trend"]
     
-    def __init__(self, llm=None):
+    # SubAgent 自身超时处理之外的兜底宽限 (秒)
+    DEADLINE_GRACE_S = 0.5
+    
+    def __init__(self, llm=None, graph: AgentGraph = None, results: ResultStore = None,
+                 incremental: bool = True):
         self.llm = llm
-        self.memory = WorkingMemory()
         self.validator = OutputValidator()
-        
-        self.subagents = {
-            "parsing": FinancialParsingAgent(llm),
-            "trend": TrendAnalysisAgent(llm),
-            "sentiment": SentimentAgent(llm),
-            "whale": WhaleBehaviorAgent(llm),
-            "risk": RiskAssessmentAgent(llm),
-            "synthesis": SynthesisAgent(llm)
-        }
+        self.graph = graph or AgentGraph.from_config()
+        self.execution_order = self.graph.order
+        self.subagents = {name: node.create(llm) for name, node in self.graph.nodes.items()}
+        # 结果复用存储 (未注入时使用 agents.incremental 配置的共享存储; incremental=False 关闭)
+        self.results = (results or get_result_store()) if incremental else None
+    
+    def analyze(self, stock: str, quarter: str = "Q4 2025",
+                raw_text: str = "", actual_data: Dict = None,
+                budget_ms: int = None, token_budget: TokenBudget = None) -> Dict[str, Any]:
+        """同步分析 - 不可在运行中的事件循环内调用, 请改用 analyze_async"""
+        return asyncio.run(self.analyze_async(stock, quarter, raw_text, actual_data, budget_ms, token_budget))
     
-    def analyze(self, stock: str, quarter: str = "Q4 2025", 
-                raw_text: str = "", actual_data: Dict = None) -> Dict[str, Any]:
+    async def analyze_async(self, stock: str, quarter: str = "Q4 2025",
+                            raw_text: str = "", actual_data: Dict = None,
+                            budget_ms: int = None, token_budget: TokenBudget = None) -> Dict[str, Any]:
+        final = None
+        with trace_context():
+            async for event in self.analyze_stream(stock, quarter, raw_text, actual_data, budget_ms,
+                                                   token_budget):
+                if event["event"] == "final":
+                    final = event["data"]
+        return final
+    
+    async def analyze_stream(self, stock: str, quarter: str = "Q4 2025",
+                             raw_text: str = "", actual_data: Dict = None,
+                             budget_ms: int = None,
+                             token_budget: TokenBudget = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式分析 - 逐个产出事件 {"event": ..., "data": ...}
+        - start: 分析开始
+        - subagent: 某个 SubAgent 完成 (校验后的输出、警告、耗时; 因预算跳过时带 skipped)
+        - final: 最终结果 (与 analyze_async 返回值相同)
+        """
         start_time = time.time()
+        started = time.perf_counter()
+        budget = AnalysisBudget(budget_ms)
+        tokens = token_budget or TokenBudget.for_analysis()
+        usage = {}
+        trace_id = current_trace_id()
         
-        # 1. 初始化
-        context = self.memory.init(stock, quarter, raw_text)
-        context.execution_order = self.EXECUTION_ORDER.copy()
+        # 1. 初始化 (每次调用独立的 WorkingMemory, 并发请求互不覆盖)
+        memory = WorkingMemory()
+        context = memory.init(stock, quarter, raw_text)
+        context.execution_order = self.execution_order.copy()
         
         if actual_data:
             context.financial_metrics["actual_data"] = actual_data
         
         print(f"\n{'='*60}")
-        print(f"MasterAgent (Parallel) - {stock} {quarter}")
+        print(f"MasterAgent (Graph) - {stock} {quarter}")
         print(f"{'='*60}")
+        yield {"event": "start", "data": {"stock": stock, "quarter": quarter, "budget_ms": budget.budget_ms,
+                                          "token_budget": tokens.describe(), "trace_id": trace_id}}
         
-        # 2. Phase 1: Parsing (必须先获取数据)
-        print(f"\n[Phase 1] Parsing...")
-        self._run_agent("parsing")
-        
-        # 3. Phase 2: 完全并行 (trend/sentiment/whale/risk)
-        print(f"\n[Phase 2] Parallel: trend, sentiment, whale, risk...")
-        self._run_parallel(["trend", "sentiment", "whale", "risk"])
-        
-        # 4. Phase 3: Synthesis
-        print(f"\n[Phase 3] Synthesis...")
-        synthesis_result = self.subagents["synthesis"].run(self.memory.to_dict())
+        # 2. 按依赖图调度, 按完成顺序产出
+        results, durations, skipped, reused = {}, {}, [], []
+        async for event in self._run_graph(memory, budget, tokens, durations, skipped, reused, start_time):
+            data = event["data"]
+            results[data["agent"]] = data["result"]
+            if not data["result"].get("skipped") and not data["result"].get("reused"):
+                self._charge(tokens, usage, event)
+            yield event
         
+        synthesis_result = results.get(self.FINAL_AGENT, {})
+        critical_path = self.graph.critical_path(durations)
         execution_time = int((time.time() - start_time) * 1000)
+        record_span("analyze", "analyze", started, status="error" if context.errors else "ok",
+                    stock=stock, quarter=quarter, critical_path=",".join(critical_path["path"]))
         
         print(f"\n{'='*60}")
-        print(f"Complete! Time: {execution_time}ms")
+        print(f"Complete! Time: {execution_time}ms (critical path: {' -> '.join(critical_path['path'])})")
         print(f"Recommendation: {synthesis_result.get('structured_data', {}).get('recommendation', 'N/A')}")
         print(f"{'='*60}")
         
+        yield {
+            "event": "final",
+            "data": {
+                "stock": stock,
+                "quarter": quarter,
+                "result": synthesis_result,
+                "execution_time_ms": execution_time,
+                "budget_ms": budget.budget_ms,
+                "critical_path": critical_path,
+                "reused": reused,
+                "total_tokens": sum(u["tokens_used"] for u in usage.values()),
+                "tokens": {
+                    "tokenizer": tokenizer_name(),
+                    "by_agent": usage,
+                    "budget": tokens.describe(),
+                    "skipped": skipped
+                },
+                "trace_id": trace_id,
+                "memory": memory.to_dict()
+            }
+        }
+    
+    @staticmethod
+    def _event(name: str, result: Dict, warnings: List[str], start_time: float) -> Dict[str, Any]:
         return {
-            "stock": stock,
-            "quarter": quarter,
-            "result": synthesis_result,
-            "execution_time_ms": execution_time,
-            "memory": self.memory.to_dict()
+            "event": "subagent",
+            "data": {
+                "agent": name,
+                "result": result,
+                "warnings": warnings,
+                "latency_ms": result.get("latency_ms"),
+                "elapsed_ms": int((time.time() - start_time) * 1000)
+            }
         }
     
-    def _run_agent(self, name: str):
-        agent = self.subagents.get(name)
-        if not agent:
+    @staticmethod
+    def _charge(tokens: TokenBudget, usage: Dict[str, Dict[str, int]], event: Dict[str, Any]):
+        """记录单个 SubAgent 的 token 用量并扣减预算"""
+        name, result = event["data"]["agent"], event["data"]["result"]
+        usage[name] = {key: result.get(key, 0) for key in ("prompt_tokens", "completion_tokens", "tokens_used")}
+        tokens.charge(usage[name]["tokens_used"])
+        TOKENS_TOTAL.inc(usage[name]["prompt_tokens"], agent=name, type="prompt")
+        TOKENS_TOTAL.inc(usage[name]["completion_tokens"], agent=name, type="completion")
+    
+    def _fits_tokens(self, name: str, memory: WorkingMemory, tokens: TokenBudget, optional: List[str],
+                     reserved: Dict[str, int], unstarted: Set[str]) -> bool:
+        """
+        可选 SubAgent 启动前的预算检查: 自身预估 + 尚未启动的必需 SubAgent 预估
+        + 运行中 SubAgent 的预留, 超出剩余预算则跳过; 必需 SubAgent 总是执行
+        """
+        if name not in optional or not tokens.limited():
+            return True
+        context = memory.to_dict()
+        required = [n for n in unstarted if n != name and n not in optional]
+        need = self.subagents[name].estimate_cost(context) + sum(reserved.values())
+        need += sum(self.subagents[n].estimate_cost(context) for n in required)
+        return tokens.fits(need)
+    
+    def _fingerprint(self, name: str, context: Dict, inputs: Dict) -> str:
+        agent = self.subagents[name]
+        return fingerprint(name, agent.version, inputs, agent.data_snapshot(context), agent.model_fingerprint())
+    
+    def _inputs(self, name: str, context: Dict) -> Dict[str, Any]:
+        """计入指纹的输入: ticker/季度 + 图中声明的 inputs + prompt 用到的 namespace"""
+        namespaces = set(self.graph.nodes[name].inputs) | set(self.subagents[name].prompt_fields)
+        return {key: context.get(key) for key in sorted(namespaces | {"stock", "quarter"})}
+    
+    def _reuse(self, name: str, context: Dict, inputs: Dict) -> Dict:
+        """指纹一致的已保存结果 (标记 reused, 不计 token); 无则 None"""
+        if self.results is None:
+            return None
+        agent = self.subagents[name]
+        if any(fetched_at is None for fetched_at in agent.data_snapshot(context).values()):
+            return None
+        result = self.results.get(context["stock"], context["quarter"], name,
+                                  self._fingerprint(name, context, inputs))
+        if result is None:
+            return None
+        return {**result, "reused": True, "latency_ms": 0, "tokens_used": 0}
+    
+    def _save(self, name: str, context: Dict, inputs: Dict, result: Dict):
+        """保存正常完成的结果 (出错/降级为 mock_response 的不保存); 指纹使用执行后的行情快照"""
+        if self.results is None or result.get("error") or result.get("skipped") or result.get("fallback"):
             return
+        try:
+            self.results.put(context["stock"], context["quarter"], name,
+                             self._fingerprint(name, context, inputs), result)
+        except Exception as e:
+            print(f"  ⚠️ {name}: result not saved ({e})")
+    
+    async def _run_with_deadline(self, agent, context: Dict, deadline: Deadline) -> Dict:
+        """SubAgent 按截止时间执行, 兜底超时后取消并返回 timeout 结果"""
+        start = time.time()
+        async with span(agent.name, kind="subagent", stock=context.get("stock")) as s:
+            try:
+                result = await asyncio.wait_for(
+                    agent.run_async(context, deadline),
+                    timeout=deadline.remaining() + self.DEADLINE_GRACE_S
+                )
+            except asyncio.TimeoutError:
+                result = agent.timeout_result(start)
+            error = result.get("error")
+            if error:
+                s.set_status("timeout" if error == "timeout" else "error")
+                s.set("error", error)
+            return result
+    
+    def _record_error(self, memory: WorkingMemory, name: str, result: Dict):
+        if result and result.get("error"):
+            memory.add_error(f"{name}: {result['error']}")
+    
+    def _complete(self, memory: WorkingMemory, name: str, result: Dict, start_time: float) -> Dict[str, Any]:
+        """SubAgent 完成: 记录错误, 校验, 写入 memory, 返回事件"""
+        self._record_error(memory, name, result)
         
-        result = agent.run(self.memory.to_dict())
-        
+        warnings = []
         try:
             validated = self.validator.validate(result)
             warnings = self.validator.get_warnings(validated)
-            if warnings:
-                for w in warnings:
-                    print(f"  ⚠️ {w}")
+            for w in warnings:
+                print(f"  ⚠️ {w}")
         except Exception as e:
             print(f"  ❌ Error: {e}")
             validated = result
+            warnings = [str(e)]
         
-        self._update_memory(name, validated)
-    
-    def _run_parallel(self, names: List[str]):
-        def run_and_update(name):
-            agent = self.subagents.get(name)
-            if not agent:
-                return name, None
-            result = agent.run(self.memory.to_dict())
-            return name, result
+        self._update_memory(memory, name, validated)
+        print(f"  ✓ {name} done")
+        return self._event(name, validated, warnings, start_time)
+    
+    async def _run_graph(self, memory: WorkingMemory, budget: AnalysisBudget, tokens: TokenBudget,
+                         durations: Dict[str, float], skipped: List[str], reused: List[str],
+                         start_time: float) -> AsyncIterator[Dict[str, Any]]:
+        """
+        依赖图调度: 依赖全部结束 (完成/失败/跳过/复用) 的节点立即启动, 每完成一个产出一个事件
+        同时就绪的节点中, 必需的先启动, 可选的按 optional 逆序 (越靠后越优先拿到预算)
+        指纹一致的节点不启动, 直接产出保存的结果
+        """
+        optional = list(load_token_config().get("optional", self.DEFAULT_OPTIONAL))
+        priority = {name: -i for i, name in enumerate(optional)}
+        finished: Set[str] = set()
+        running: Dict[asyncio.Future, str] = {}
+        reserved: Dict[str, int] = {}
+        launched: Dict[str, tuple] = {}  # 启动时的 (context, inputs), 用于保存结果的指纹
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            futures = {executor.submit(run_and_update, name): name for name in names}
-            
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    name, result = future.result()
-                    if result:
-                        validated = self.validator.validate(result)
-                        self._update_memory(name, validated)
-                        print(f"  ✓ {name} done")
-                except Exception as e:
-                    print(f"  ❌ {futures[future]}: {e}")
-    
-    def _update_memory(self, step_name: str, result: Dict):
-        data = result.get("structured_data", {})
+        async def run_one(name: str, context: Dict):
+            agent_start = time.perf_counter()
+            result = await self._run_with_deadline(self.subagents[name], context, budget.for_agent(name))
+            return result, (time.perf_counter() - agent_start) * 1000
         
-        if step_name == "parsing":
-            self.memory.update_financial(data)
-        elif step_name == "trend":
-            self.memory.update_trend(data)
-        elif step_name == "sentiment":
-            self.memory.update_sentiment(data)
-        elif step_name == "whale":
-            self.memory.update_whale(data)
+        try:
+            while len(finished) < len(self.graph):
+                ready = self.graph.ready(finished, set(running.values()))
+                ready.sort(key=lambda n: (n in priority, priority.get(n, 0)))
+                unstarted = set(self.graph.nodes) - finished - set(running.values())
+                for name in ready:
+                    context = memory.to_dict()
+                    inputs = self._inputs(name, context)
+                    previous = self._reuse(name, context, inputs)
+                    if previous is not None:
+                        print(f"  ♻ {name} reused")
+                        record_span(name, "subagent", time.perf_counter(), stock=context["stock"], reused=True)
+                        finished.add(name)
+                        durations[name] = 0.0
+                        reused.append(name)
+                        unstarted.discard(name)
+                        yield self._complete(memory, name, previous, start_time)
+                        continue
+                    if not self._fits_tokens(name, memory, tokens, optional, reserved, unstarted):
+                        print(f"  ⏭ {name} skipped (token budget, remaining {tokens.remaining()})")
+                        finished.add(name)
+                        skipped.append(name)
+                        yield self._event(name, self.subagents[name].skipped_result("token_budget"),
+                                          ["Skipped: token budget"], start_time)
+                        continue
+                    print(f"  ▶ {name}")
+                    if tokens.limited():
+                        reserved[name] = self.subagents[name].estimate_cost(memory.to_dict())
+                    launched[name] = (context, inputs)
+                    running[asyncio.ensure_future(run_one(name, context))] = name
+                    unstarted.discard(name)
+                
+                if not running:
+                    if not ready:
+                        break
+                    # 本轮全部跳过/复用: 下游可能已就绪, 重新检查
+                    continue
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    reserved.pop(name, None)
+                    finished.add(name)
+                    try:
+                        result, durations[name] = task.result()
+                    except Exception as e:
+                        print(f"  ❌ {name}: {e}")
+                        memory.add_error(f"{name}: {e}")
+                        continue
+                    event = self._complete(memory, name, result, start_time)
+                    await asyncio.to_thread(self._save, name, *launched.pop(name), event["data"]["result"])
+                    yield event
+        finally:
+            # 消费方中途退出 (如 SSE 客户端断开) 时取消仍在运行的 SubAgent
+            for task in running:
+                task.cancel()
+    
+    def _update_memory(self, memory: WorkingMemory, step_name: str, result: Dict):
+        """写入该 SubAgent 的 output namespace; 最终节点 (无 output) 不写入"""
+        output = self.graph.nodes[step_name].output
+        if output is None:
+            return
+        memory.update_namespace(output, result.get("structured_data", {}))
         
         for flag in result.get("risk_flags", []):
-            self.memory.add_risk_flag(flag)
+            memory.add_risk_flag(flag)
@@ -3,95 +3,206 @@ Base SubAgent - 优化版 (超时控制)
 """
 import json
 import time
-import subprocess
-import signal
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from abc import ABC, abstractmethod
 
+from llm import LLMBackend, LLMTimeout, ResponseCache, get_default_backend, get_response_cache, make_key
+from deadline import Deadline, subagent_timeout
+from market_cache import market_cache
+from tokens import count_tokens, completion_estimate
+from .prompt_context import render_context, size_report
+from .prompt_batch import active_batcher
+
 
 class TimeoutException(Exception):
     pass
 
 
-def timeout_handler(signum, frame):
-    raise TimeoutException("LLM call timeout")
-
-
 class BaseSubAgent(ABC):
-    """优化版 SubAgent - 支持超时"""
+    """
+    优化版 SubAgent - 支持超时
+    无状态: 单次调用的 latency/tokens 只写入返回结果, 实例可被并发分析共享
+    超时: 由调用方传入 Deadline; 未传入时使用 agent_config.yaml 中的 timeout_ms
+    缓存: 相同 (名称, 版本, prompt, 模型配置) 的 LLM 响应直接复用, 修改 prompt 模板时请升级 version
+    token: prompt_tokens/completion_tokens 按分词器计数; tokens_used 为实际消耗 (缓存命中为 0)
+    prompt: prompt_fields 声明用到的 namespace 与字段, 经 prompt_context 紧凑序列化后写入 prompt
+    增量: datasets 声明读取的 market_cache 数据集, 其快照时间计入结果指纹 (agents/incremental.py)
+    合并: batchable 的 SubAgent 在批量运行时可与其它股票合并为一次 LLM 调用 (prompt_batch)
+    """
+    
+    config_key = ""  # agent_config.yaml 中 agents.subagents 的 key
+    version = "1.0"
+    uses_llm = True
+    prompt_fields: Dict[str, Optional[Tuple[str, ...]]] = {}  # {namespace: 字段, None 为全部}
+    datasets: Tuple[str, ...] = ()  # 读取的 market_cache 数据集
+    batchable = False
+    batch_instruction = ""  # 合并 prompt 的说明, 如 "你是情绪分析专家。分别分析以下股票的投资者情绪"
+    response_format = ""    # 单只股票的返回 JSON 格式
     
     def __init__(self, name: str, llm=None):
         self.name = name
         self.llm = llm
-        self.latency_ms = 0
-        self.tokens_used = 0
-        self.timeout = 20  # 20秒超时
+        self.cache = None  # 未注入时使用 llm_config.yaml 中的共享缓存
+        self.use_cache = True
+        self.timeout = subagent_timeout(self.config_key)
     
-    def run(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def run(self, context: Dict[str, Any], deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         start_time = time.time()
+        deadline = deadline or Deadline(self.timeout)
         
         try:
             prompt = self.build_prompt(context)
-            response = self._call_llm_with_timeout(prompt)
-            result = self.parse_response(response)
-            
-            result["module"] = self.name
-            result["latency_ms"] = int((time.time() - start_time) * 1000)
-            result["tokens_used"] = self.estimate_tokens(prompt, response)
-            
-            return result
-            
+            response, billed = self._call_llm(prompt, deadline)
+            return self._build_result(prompt, response, start_time, billed)
+        
         except TimeoutException:
-            return {
-                "module": self.name,
-                "confidence": 0.5,
-                "key_findings": ["LLM 调用超时"],
-                "structured_data": {},
-                "error": "timeout",
-                "latency_ms": int((time.time() - start_time) * 1000)
-            }
+            return self.timeout_result(start_time)
         except Exception as e:
-            return {
-                "module": self.name,
-                "confidence": 0.0,
-                "key_findings": [],
-                "structured_data": {},
-                "error": str(e),
-                "latency_ms": int((time.time() - start_time) * 1000)
-            }
-    
-    def _call_llm_with_timeout(self, prompt: str) -> str:
-        """带超时的 LLM 调用"""
+            return self._error_result(e, start_time)
+    
+    async def run_async(self, context: Dict[str, Any],
+                        deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """异步版 run - 不阻塞事件循环"""
+        start_time = time.time()
+        deadline = deadline or Deadline(self.timeout)
+        
         try:
-            # 设置超时
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(self.timeout)
-            
-            result = self.call_llm(prompt)
-            
-            signal.alarm(0)  # 取消超时
-            return result
-            
+            prompt = self.build_prompt(context)
+            batcher = active_batcher() if self.batchable else None
+            if batcher is not None:
+                return await batcher.run(self, context, prompt, deadline, start_time)
+            response, billed = await self._call_llm_async(prompt, deadline)
+            return self._build_result(prompt, response, start_time, billed)
+        
         except TimeoutException:
-            signal.alarm(0)
+            return self.timeout_result(start_time)
+        except Exception as e:
+            return self._error_result(e, start_time)
+    
+    def _build_result(self, prompt: str, response: str, start_time: float,
+                      billed: bool = True) -> Dict[str, Any]:
+        result = self.parse_response(response)
+        
+        result["module"] = self.name
+        result["latency_ms"] = int((time.time() - start_time) * 1000)
+        result.update(self.token_usage(prompt, response, billed))
+        if billed is None:
+            result["fallback"] = True
+        
+        return result
+    
+    def timeout_result(self, start_time: float) -> Dict[str, Any]:
+        return {
+            "module": self.name,
+            "confidence": 0.5,
+            "key_findings": ["LLM 调用超时"],
+            "structured_data": {},
+            "error": "timeout",
+            "latency_ms": int((time.time() - start_time) * 1000)
+        }
+    
+    def _error_result(self, error: Exception, start_time: float) -> Dict[str, Any]:
+        return {
+            "module": self.name,
+            "confidence": 0.0,
+            "key_findings": [],
+            "structured_data": {},
+            "error": str(error),
+            "latency_ms": int((time.time() - start_time) * 1000)
+        }
+    
+    def skipped_result(self, reason: str) -> Dict[str, Any]:
+        """因预算不足未执行 (不计为错误)"""
+        return {
+            "module": self.name,
+            "confidence": 0.0,
+            "key_findings": [],
+            "structured_data": {},
+            "skipped": reason,
+            "latency_ms": 0,
+            "tokens_used": 0
+        }
+    
+    @property
+    def backend(self) -> LLMBackend:
+        """LLM 后端 - 未注入时使用进程内共享的默认后端"""
+        return self.llm or get_default_backend()
+    
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        if not self.use_cache or not self.backend.cacheable:
+            return None
+        return self.cache or get_response_cache()
+    
+    def cache_key(self, prompt: str) -> str:
+        return make_key(self.name, self.version, prompt, self.backend.fingerprint())
+    
+    def _cache_lookup(self, prompt: str):
+        """返回 (cache, key, 命中的响应)"""
+        cache = self.response_cache
+        if cache is None:
+            return None, None, None
+        key = self.cache_key(prompt)
+        return cache, key, cache.get(key)
+    
+    def call_llm(self, prompt: str, deadline: Optional[Deadline] = None) -> str:
+        """
+        调用 LLM 后端, 失败/空回复时使用 mock_response
+        超过 deadline 时后端会终止调用, 这里抛出 TimeoutException
+        """
+        return self._call_llm(prompt, deadline)[0]
+    
+    async def call_llm_async(self, prompt: str, deadline: Optional[Deadline] = None) -> str:
+        """异步调用 LLM 后端"""
+        return (await self._call_llm_async(prompt, deadline))[0]
+    
+    def _call_llm(self, prompt: str, deadline: Optional[Deadline] = None) -> Tuple[str, Optional[bool]]:
+        """
+        返回 (响应, 是否计入 token 消耗); 缓存命中不计入
+        后端调用失败时为 (mock_response, None): 不计入, 结果标记 fallback (不保存复用)
+        """
+        cache, key, cached = self._cache_lookup(prompt)
+        if cached is not None:
+            return cached, False
+        
+        deadline = deadline or Deadline(self.timeout)
+        if deadline.expired():
+            raise TimeoutException("LLM call timeout")
+        try:
+            response = self.backend.complete(prompt, timeout=deadline.remaining())
+        except LLMTimeout:
             raise TimeoutException("LLM call timeout")
+        except Exception:
+            return self.mock_response(), None
+        
+        if not response:
+            # 空回复时 prompt 已发送, 仍计入消耗
+            return self.mock_response(), True
+        if cache is not None:
+            cache.put(key, response, agent=self.name)
+        return response, True
     
-    def call_llm(self, prompt: str) -> str:
-        """调用 MiniMax MCP"""
+    async def _call_llm_async(self, prompt: str, deadline: Optional[Deadline] = None) -> Tuple[str, Optional[bool]]:
+        cache, key, cached = self._cache_lookup(prompt)
+        if cached is not None:
+            return cached, False
+        
+        deadline = deadline or Deadline(self.timeout)
+        if deadline.expired():
+            raise TimeoutException("LLM call timeout")
         try:
-            cmd = ["/home/mars/.opencode/bin/opencode", "run", prompt]
-            result = subprocess.run(
-                cmd, capture_output=True, text=True, timeout=self.timeout
-            )
-            
-            import re
-            output = re.sub(r'\x1b\[[0-9;]*m', '', result.stdout)
-            return output.strip()
-            
-        except subprocess.TimeoutExpired:
-            return self.mock_response()
-        except Exception as e:
-            return self.mock_response()
+            response = await self.backend.complete_async(prompt, timeout=deadline.remaining())
+        except LLMTimeout:
+            raise TimeoutException("LLM call timeout")
+        except Exception:
+            return self.mock_response(), None
+        
+        if not response:
+            # 空回复时 prompt 已发送, 仍计入消耗
+            return self.mock_response(), True
+        if cache is not None:
+            cache.put(key, response, agent=self.name)
+        return response, True
     
     def parse_response(self, response: str) -> Dict[str, Any]:
         try:
@@ -104,10 +215,55 @@ class BaseSubAgent(ABC):
         return {"confidence": 0.5, "key_findings": [], "structured_data": {}}
     
     def estimate_tokens(self, prompt: str, response: str) -> int:
-        return len(prompt.split()) + len(response.split())
+        return count_tokens(prompt) + count_tokens(response)
+    
+    def token_usage(self, prompt: str, response: str, billed: bool = True) -> Dict[str, int]:
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(response)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_used": prompt_tokens + completion_tokens if billed else 0
+        }
+    
+    def estimate_cost(self, context: Dict[str, Any]) -> int:
+        """执行前预估 token 消耗 (prompt 实际计数 + 预估回复长度), 用于预算规划"""
+        if not self.uses_llm:
+            return 0
+        return count_tokens(self.build_prompt(context)) + completion_estimate()
+    
+    def data_snapshot(self, context: Dict[str, Any]) -> Dict[str, Optional[float]]:
+        """{数据集: fetched_at}; 为 None 表示尚未缓存, 本次必然重新拉取"""
+        stock = context.get("stock", "")
+        return {dataset: market_cache.fetched_at(dataset, stock) for dataset in self.datasets}
+    
+    def model_fingerprint(self) -> Optional[Dict[str, Any]]:
+        return self.backend.fingerprint() if self.uses_llm else None
+    
+    def prompt_context(self, context: Dict[str, Any]) -> Dict[str, str]:
+        """prompt_fields 中各 namespace 的紧凑文本"""
+        return render_context(context, self.prompt_fields)
+    
+    def prompt_size(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """与整个 dict 直接写入 prompt 相比的大小"""
+        return size_report(context, self.prompt_fields)
     
     def build_prompt(self, context: Dict[str, Any]) -> str:
         raise NotImplementedError
     
+    def build_batch_prompt(self, contexts: List[Dict[str, Any]]) -> str:
+        """多只股票合并: 说明与返回格式只写一次, 每只股票一行紧凑上下文"""
+        stocks = [str(context.get("stock", "")).upper() for context in contexts]
+        lines = "\n".join(
+            f"[{stock}] " + " | ".join(self.prompt_context(context).values())
+            for stock, context in zip(stocks, contexts)
+        )
+        return f"""{self.batch_instruction} (共 {len(stocks)} 只):
+
+{lines}
+
+请返回一个JSON对象, key 为股票代码 ({", ".join(stocks)}), 每个 value 的格式:
+{self.response_format}"""
+
     def mock_response(self) -> str:
         raise NotImplementedError
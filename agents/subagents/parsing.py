@@ -2,18 +2,26 @@
 FinancialParsingSubAgent - 财报解析专家
 集成 LLM 分析 + 真实数据获取
 """
-from .base import BaseSubAgent
-from tools import get_financial_data
+import time
+from typing import Optional
+from .base import BaseSubAgent, TimeoutException
+from .prompt_context import FINANCIAL_FIELDS
+from tools import get_financial_data, get_financial_data_async
 
 
 class FinancialParsingAgent(BaseSubAgent):
     """财报解析 - LLM 分析 + 真实数据"""
     
+    config_key = "parsing"
+    version = "1.1"
+    prompt_fields = {"financial_metrics": ("actual_data",) + FINANCIAL_FIELDS}
+    datasets = ("fundamentals", "filings")  # get_financial_data 同时读取 SEC filings
+    
     def __init__(self, llm=None):
         super().__init__("financial_parsing", llm)
     
     def build_prompt(self, context: dict) -> str:
-        financial = context.get("financial_metrics", {})
+        sections = self.prompt_context(context)
         
         return f"""你是财报解析专家。分析以下财务数据，给出结构化评估:
 
@@ -21,7 +29,7 @@ class FinancialParsingAgent(BaseSubAgent):
 季度: {context.get('quarter', 'N/A')}
 
 财务指标:
-{financial}
+{sections['financial_metrics']}
 
 请返回JSON格式:
 {{
@@ -38,58 +46,105 @@ class FinancialParsingAgent(BaseSubAgent):
     }},
     "risk_flags": []
 }}"""
-    
-    def run(self, context: dict) -> dict:
+
+    def run(self, context: dict, deadline=None) -> dict:
         """执行分析"""
-        import time
         start = time.time()
         
         try:
-            stock = context.get("stock", "NVDA")
-            
             # 1. 获取真实财务数据
-            actual_data = context.get("financial_metrics", {}).get("actual_data")
-            
-            if actual_data:
-                data = actual_data.copy()
-                data["source"] = "manual"
-                data["revenue_b"] = actual_data.get("revenue", 0) / 1e9
-                data["net_income_b"] = actual_data.get("net_income", 0) / 1e9
-            else:
-                data = get_financial_data(stock)
+            data = self._manual_data(context)
+            if data is None:
+                data = get_financial_data(context.get("stock", "NVDA"))
                 data["source"] = "yfinance"
             
             # 2. 构建 LLM prompt
             prompt = self.build_prompt(context)
             
             # 3. 调用 LLM 分析
-            llm_result = self.call_llm(prompt)
-            analysis = self.parse_response(llm_result)
+            try:
+                llm_result, billed = self._call_llm(prompt, deadline)
+            except TimeoutException:
+                return self._merge(data, prompt, "", start, timed_out=True)
             
             # 4. 合并结果
-            result = {
-                "module": "financial_parsing",
-                "confidence": analysis.get("confidence", 0.80),
-                "key_findings": analysis.get("key_findings", data.get("key_findings", [])),
-                "structured_data": {
-                    **data,
-                    **analysis.get("structured_data", {})
-                },
-                "risk_flags": analysis.get("risk_flags", []),
-                "latency_ms": int((time.time() - start) * 1000),
-                "tokens_used": self.estimate_tokens(prompt, llm_result)
-            }
+            return self._merge(data, prompt, llm_result, start, billed=billed)
+        
+        except Exception as e:
+            return self._parsing_error(e)
+    
+    async def run_async(self, context: dict, deadline=None) -> dict:
+        """异步执行分析"""
+        start = time.time()
+        
+        try:
+            data = self._manual_data(context)
+            if data is None:
+                data = await get_financial_data_async(context.get("stock", "NVDA"))
+                data["source"] = "yfinance"
             
-            return result
+            prompt = self.build_prompt(context)
+            try:
+                llm_result, billed = await self._call_llm_async(prompt, deadline)
+            except TimeoutException:
+                return self._merge(data, prompt, "", start, timed_out=True)
             
+            return self._merge(data, prompt, llm_result, start, billed=billed)
+        
         except Exception as e:
-            return {
-                "module": "financial_parsing",
-                "confidence": 0.0,
-                "error": str(e),
-                "structured_data": {},
-                "risk_flags": []
-            }
+            return self._parsing_error(e)
+    
+    def data_snapshot(self, context: dict) -> dict:
+        """手动输入实际数据时不读取 yfinance"""
+        if context.get("financial_metrics", {}).get("actual_data"):
+            return {}
+        return super().data_snapshot(context)
+    
+    def _manual_data(self, context: dict):
+        """手动输入的实际数据 (优先于 yfinance)"""
+        actual_data = context.get("financial_metrics", {}).get("actual_data")
+        if not actual_data:
+            return None
+        
+        data = actual_data.copy()
+        data["source"] = "manual"
+        data["revenue_b"] = actual_data.get("revenue", 0) / 1e9
+        data["net_income_b"] = actual_data.get("net_income", 0) / 1e9
+        return data
+    
+    def _merge(self, data: dict, prompt: str, llm_result: str, start: float,
+               timed_out: bool = False, billed: Optional[bool] = True) -> dict:
+        """合并真实数据与 LLM 分析 (LLM 超时时只保留真实数据, prompt 仍计入消耗)"""
+        analysis = self.parse_response(llm_result) if not timed_out else {
+            "confidence": 0.5, "key_findings": ["LLM 调用超时"]
+        }
+        
+        result = {
+            "module": "financial_parsing",
+            "confidence": analysis.get("confidence", 0.80),
+            "key_findings": analysis.get("key_findings", data.get("key_findings", [])),
+            "structured_data": {
+                **data,
+                **analysis.get("structured_data", {})
+            },
+            "risk_flags": analysis.get("risk_flags", []),
+            "latency_ms": int((time.time() - start) * 1000),
+            **self.token_usage(prompt, llm_result, billed)
+        }
+        if timed_out:
+            result["error"] = "timeout"
+        if billed is None:
+            result["fallback"] = True
+        return result
+    
+    def _parsing_error(self, e: Exception) -> dict:
+        return {
+            "module": "financial_parsing",
+            "confidence": 0.0,
+            "error": str(e),
+            "structured_data": {},
+            "risk_flags": []
+        }
     
     def mock_response(self) -> str:
         return """{
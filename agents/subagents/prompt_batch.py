@@ -0,0 +1,210 @@
+"""
+Prompt Batch - 批量运行时把多只股票合并为一次 LLM 调用 (agent_config.yaml -> agents.batch.prompt_batch)
+- 同一 SubAgent (batchable) 在 window_ms 内的调用合并, 每批最多 max_tickers 只
+- 说明与返回格式只写一次, LLM 返回以股票代码为 key 的 JSON 对象
+- 逐只校验 (confidence/structured_data), 缺失或无效的股票退回单独调用; 整批失败时全部退回
+- 拆分后的回复按单只 prompt 写入响应缓存
+- 合并调用的 token (prompt + 完整回复) 按参与的股票均摊, 退回单独调用的股票同样分摊
+- 只在 batching() 范围内生效 (controller.batch.run_batch), 单次分析不受影响
+"""
+import json
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import load_agent_config
+from tokens import count_tokens
+
+
+DEFAULT_MAX_TICKERS = 4
+DEFAULT_WINDOW_MS = 100
+
+_active: ContextVar[Optional["PromptBatcher"]] = ContextVar("prompt_batcher", default=None)
+
+
+def load_prompt_batch_config() -> Dict[str, Any]:
+    return load_agent_config().get("agents", {}).get("batch", {}).get("prompt_batch", {}) or {}
+
+
+def active_batcher() -> Optional["PromptBatcher"]:
+    return _active.get()
+
+
+@contextmanager
+def batching(batcher: Optional["PromptBatcher"]):
+    """在此范围内 (含其中创建的 task) batchable SubAgent 的调用经 batcher 合并"""
+    token = _active.set(batcher)
+    try:
+        yield batcher
+    finally:
+        _active.reset(token)
+
+
+def _valid_item(value: Any) -> bool:
+    if not isinstance(value, dict) or not isinstance(value.get("structured_data"), dict):
+        return False
+    confidence = value.get("confidence")
+    return isinstance(confidence, (int, float)) and not isinstance(confidence, bool) and 0 <= confidence <= 1
+
+
+def split_response(response: str, stocks: Iterable[str]) -> Dict[str, str]:
+    """按股票代码拆分批量回复, 只保留格式有效的条目 (值为单只股票的 JSON 文本)"""
+    start, end = response.find("{"), response.rfind("}") + 1
+    if start < 0 or end <= start:
+        return {}
+    try:
+        data = json.loads(response[start:end])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    
+    by_stock = {str(key).strip().upper(): value for key, value in data.items()}
+    parts = {}
+    for stock in stocks:
+        value = by_stock.get(stock.upper())
+        if _valid_item(value):
+            parts[stock] = json.dumps(value, ensure_ascii=False)
+    return parts
+
+
+def _share(total: int, count: int, index: int) -> int:
+    """total 均分为 count 份, 余数计入第一份 (各份之和等于 total)"""
+    return total // count + (total % count if index == 0 else 0)
+
+
+class _Pending:
+    def __init__(self, context: Dict[str, Any], prompt: str, deadline, future: asyncio.Future):
+        self.stock = str(context.get("stock", "")).upper()
+        self.context = context
+        self.prompt = prompt
+        self.deadline = deadline
+        self.future = future
+    
+    def resolve(self, outcome):
+        """
+        outcome: (单只回复, 分摊的 token, 批大小); 单只回复为 None 或 outcome 为 None 时退回单独调用
+        等待方已取消 (超时) 时忽略
+        """
+        if not self.future.done():
+            self.future.set_result(outcome)
+
+
+class PromptBatcher:
+    """
+    微批合并器 (单个事件循环内使用)
+    run() 等待所在批次的结果: 成功时返回拆分出的单只结果, 否则按单只 prompt 单独调用
+    """
+    
+    def __init__(self, max_tickers: int = DEFAULT_MAX_TICKERS, window_ms: float = DEFAULT_WINDOW_MS):
+        self.max_tickers = max(max_tickers, 1)
+        self.window_s = window_ms / 1000
+        self._groups: Dict[int, List[_Pending]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self.stats = {"batches": 0, "batched": 0, "fallbacks": 0, "failed_batches": 0}
+    
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> Optional["PromptBatcher"]:
+        """配置关闭时返回 None"""
+        config = config if config is not None else load_prompt_batch_config()
+        if not config.get("enabled", True):
+            return None
+        return cls(config.get("max_tickers", DEFAULT_MAX_TICKERS), config.get("window_ms", DEFAULT_WINDOW_MS))
+    
+    async def run(self, agent, context: Dict[str, Any], prompt: str, deadline,
+                  start_time: float) -> Dict[str, Any]:
+        _, _, cached = agent._cache_lookup(prompt)
+        if cached is not None:
+            return agent._build_result(prompt, cached, start_time, False)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(agent, _Pending(context, prompt, deadline, future))
+        outcome = await future
+        response, usage, size = outcome or (None, None, 0)
+        if response is not None:
+            result = agent._build_result(prompt, response, start_time)
+            result.update(usage, batched=size)
+            return result
+        
+        from .base import TimeoutException
+        try:
+            response, billed = await agent._call_llm_async(prompt, deadline)
+            result = agent._build_result(prompt, response, start_time, billed)
+        except TimeoutException:
+            result = agent.timeout_result(start_time)
+        if usage:
+            # 合并调用已发生, 本只的分摊加到单独调用的消耗上
+            for key, value in usage.items():
+                result[key] = result.get(key, 0) + value
+            result["batched"] = size
+        return result
+    
+    def _enqueue(self, agent, item: _Pending):
+        group = self._groups.setdefault(id(agent), [])
+        group.append(item)
+        if len(group) >= self.max_tickers:
+            self._flush(agent)
+        elif len(group) == 1:
+            self._timers[id(agent)] = asyncio.get_running_loop().call_later(self.window_s, self._flush, agent)
+    
+    def _flush(self, agent):
+        timer = self._timers.pop(id(agent), None)
+        if timer is not None:
+            timer.cancel()
+        items = self._groups.pop(id(agent), [])
+        if items:
+            task = asyncio.ensure_future(self._call(agent, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _call(self, agent, items: List[_Pending]):
+        """一次调用覆盖整批; 任何异常都不能让等待方悬挂, 未解决的一律退回单独调用"""
+        try:
+            pending, seen = [], set()
+            for item in items:
+                if item.future.done():
+                    continue
+                if item.stock in seen:
+                    item.resolve(None)
+                    continue
+                seen.add(item.stock)
+                pending.append(item)
+            if len(pending) < 2:
+                return
+            
+            prompt = agent.build_batch_prompt([item.context for item in pending])
+            timeout = max(item.deadline.remaining() for item in pending)
+            try:
+                response = await agent.backend.complete_async(prompt, timeout=timeout)
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                print(f"  ⚠️ {agent.name}: batched call failed ({e}), falling back")
+                return
+            
+            response = response or ""
+            parts = split_response(response, [item.stock for item in pending])
+            self.stats["batches"] += 1
+            prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(response)
+            cache = agent.response_cache
+            for index, item in enumerate(pending):
+                usage = {
+                    "prompt_tokens": _share(prompt_tokens, len(pending), index),
+                    "completion_tokens": _share(completion_tokens, len(pending), index)
+                }
+                usage["tokens_used"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                part = parts.get(item.stock)
+                if part is None:
+                    self.stats["fallbacks"] += 1
+                else:
+                    self.stats["batched"] += 1
+                    if cache is not None:
+                        cache.put(agent.cache_key(item.prompt), part, agent=agent.name)
+                item.resolve((part, usage, len(pending)))
+        finally:
+            for item in items:
+                item.resolve(None)
+    
+    def describe(self) -> Dict[str, Any]:
+        return {"max_tickers": self.max_tickers, "window_ms": int(self.window_s * 1000), **self.stats}
@@ -0,0 +1,112 @@
+"""
+Prompt Context - SubAgent prompt 的紧凑上下文序列化
+- 每个 SubAgent 用 prompt_fields 声明需要的 namespace 与字段, 只序列化这些字段
+- 数值保留 4 位有效数字, 丢弃空值, 同时存在 x 与 x_b/x_t (十亿/万亿) 时只保留后者
+- 输出稳定: 按声明顺序 `key=value; key=value`, 相同上下文总是得到相同 prompt (利于响应缓存)
+- size_report: 与旧版 (整个 dict 的 repr) 对比 prompt 大小
+"""
+from typing import Any, Dict, Iterable, Optional
+
+from tokens import count_tokens
+
+
+EMPTY = "N/A"
+MAX_LIST_ITEMS = 5
+MAX_TEXT_CHARS = 120
+SCALED_SUFFIXES = ("_b", "_t")
+
+# 各 SubAgent 共用的财务字段 (financial_metrics)
+FINANCIAL_FIELDS = (
+    "quarter", "price", "revenue_b", "net_income_b", "market_cap_t", "pe_ratio",
+    "revenue_beat", "revenue_beat_percent", "eps_beat", "eps_beat_percent",
+    "profit_margin", "yoy_growth"
+)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or (isinstance(value, (list, tuple, dict)) and not value)
+
+
+def format_value(value: Any) -> str:
+    """标量/列表的紧凑表示"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return format(value, ".4g")
+    if isinstance(value, (list, tuple)):
+        items, seen = [], set()
+        for item in value:
+            text = format_value(item)
+            if text not in seen:
+                seen.add(text)
+                items.append(text)
+        more = f",+{len(items) - MAX_LIST_ITEMS}" if len(items) > MAX_LIST_ITEMS else ""
+        return "[" + ",".join(items[:MAX_LIST_ITEMS]) + more + "]"
+    if isinstance(value, dict):
+        return "{" + render(flatten(value)) + "}"
+    text = " ".join(str(value).split())
+    return text if len(text) <= MAX_TEXT_CHARS else text[:MAX_TEXT_CHARS] + "…"
+
+
+def flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """嵌套 dict 展开为 a.b 形式, 丢弃空值与冗余的原始单位字段"""
+    flat = {}
+    for key, value in data.items():
+        if _is_empty(value):
+            continue
+        if any(f"{key}{suffix}" in data for suffix in SCALED_SUFFIXES):
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def select(data: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """按声明顺序取字段; fields 为 None 时取全部"""
+    if fields is None:
+        return flatten(data)
+    selected = {}
+    for field in fields:
+        value = data.get(field)
+        if _is_empty(value):
+            continue
+        if isinstance(value, dict):
+            selected.update(flatten(value, f"{field}."))
+        else:
+            selected[field] = value
+    return selected
+
+
+def render(data: Dict[str, Any]) -> str:
+    return "; ".join(f"{key}={format_value(value)}" for key, value in data.items()) or EMPTY
+
+
+def render_context(context: Dict[str, Any], spec: Dict[str, Optional[Iterable[str]]]) -> Dict[str, str]:
+    """{namespace: 紧凑文本}; 列表型 namespace (如 risk_flags) 直接输出列表"""
+    rendered = {}
+    for namespace, fields in spec.items():
+        value = context.get(namespace)
+        if isinstance(value, dict):
+            rendered[namespace] = render(select(value, fields))
+        elif _is_empty(value):
+            rendered[namespace] = EMPTY
+        else:
+            rendered[namespace] = format_value(value)
+    return rendered
+
+
+def size_report(context: Dict[str, Any], spec: Dict[str, Optional[Iterable[str]]]) -> Dict[str, Any]:
+    """旧版 (namespace 整体 repr) 与紧凑序列化的大小对比"""
+    raw = "\n".join(str(context.get(namespace, {})) for namespace in spec)
+    compact = "\n".join(render_context(context, spec).values())
+    raw_tokens, compact_tokens = count_tokens(raw), count_tokens(compact)
+    return {
+        "raw_chars": len(raw),
+        "compact_chars": len(compact),
+        "raw_tokens": raw_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_pct": round((1 - compact_tokens / raw_tokens) * 100, 1) if raw_tokens else 0.0
+    }
@@ -2,34 +2,42 @@
 RiskAssessmentSubAgent - 风险评估专家
 """
 from .base import BaseSubAgent
+from .prompt_context import FINANCIAL_FIELDS
 
 
 class RiskAssessmentAgent(BaseSubAgent):
     """风险评估 - 综合风险"""
     
+    config_key = "risk"
+    version = "1.1"
+    prompt_fields = {"financial_metrics": FINANCIAL_FIELDS}
+    batchable = True
+    batch_instruction = "你是风险评估专家。分别评估以下股票的投资风险"
+    response_format = """{
+    "confidence": 0.85,
+    "key_findings": ["发现"],
+    "structured_data": {
+        "overall_risk": 0.55,
+        "risk_level": "LOW|MEDIUM|HIGH",
+        "volatility_risk": 0.60,
+        "valuation_risk": 0.50
+    },
+    "risk_flags": []
+}"""
+
     def __init__(self, llm=None):
         super().__init__("risk_assessment", llm)
     
     def build_prompt(self, context: dict) -> str:
-        financial = context.get("financial_metrics", {})
+        sections = self.prompt_context(context)
         
         return f"""你是风险评估专家。评估投资风险:
 
-财务数据: {financial}
+财务数据: {sections['financial_metrics']}
 
 请返回JSON格式:
-{{
-    "confidence": 0.85,
-    "key_findings": ["发现"],
-    "structured_data": {{
-        "overall_risk": 0.55,
-        "risk_level": "LOW|MEDIUM|HIGH",
-        "volatility_risk": 0.60,
-        "valuation_risk": 0.50
-    }},
-    "risk_flags": []
-}}"""
-    
+{self.response_format}"""
+
     def mock_response(self) -> str:
         return """{
     "confidence": 0.85,
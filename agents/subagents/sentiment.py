@@ -2,37 +2,44 @@
 SentimentSubAgent - 简化版 (跳过 MCP)
 """
 from .base import BaseSubAgent
+from .prompt_context import FINANCIAL_FIELDS
 
 
 class SentimentAgent(BaseSubAgent):
     """情绪分析 - LLM 分析"""
     
+    config_key = "sentiment"
+    version = "1.1"
+    prompt_fields = {"financial_metrics": FINANCIAL_FIELDS}
+    batchable = True
+    batch_instruction = "你是情绪分析专家。分别分析以下股票的投资者情绪"
+    response_format = """{
+    "confidence": 0.75,
+    "key_findings": ["发现1", "发现2"],
+    "structured_data": {
+        "analyst_sentiment": 0.65,
+        "social_sentiment": 0.58,
+        "sentiment_velocity": "STABLE"
+    },
+    "risk_flags": []
+}"""
+
     def __init__(self, llm=None):
         super().__init__("sentiment", llm)
-        self.timeout = 15  # 缩短超时
     
     def build_prompt(self, context: dict) -> str:
-        financial = context.get("financial_metrics", {})
+        sections = self.prompt_context(context)
         stock = context.get("stock", "NVDA")
         
         return f"""你是情绪分析专家。分析 {stock} 的投资者情绪:
 
-财务数据: {financial}
+财务数据: {sections['financial_metrics']}
 
 请返回JSON:
-{{
-    "confidence": 0.75,
-    "key_findings": ["发现1", "发现2"],
-    "structured_data": {{
-        "analyst_sentiment": 0.65,
-        "social_sentiment": 0.58,
-        "sentiment_velocity": "STABLE"
-    }},
-    "risk_flags": []
-}}"""
-    
-    def run(self, context: dict) -> dict:
-        return super().run(context)
+{self.response_format}"""
+
+    def run(self, context: dict, deadline=None) -> dict:
+        return super().run(context, deadline)
     
     def mock_response(self) -> str:
         return """{
@@ -2,26 +2,40 @@
 SynthesisSubAgent - 综合合成专家
 """
 from .base import BaseSubAgent
+from .prompt_context import FINANCIAL_FIELDS
 
 
 class SynthesisAgent(BaseSubAgent):
     """综合合成 - 最终决策"""
     
+    config_key = "synthesis"
+    version = "1.2"
+    prompt_fields = {
+        "financial_metrics": FINANCIAL_FIELDS,
+        "trend_signals": ("revenue_trend", "eps_trend", "momentum_score"),
+        "sentiment_data": ("analyst_sentiment", "social_sentiment", "sentiment_velocity"),
+        "whale_activity": (
+            "signal", "call_put_ratio", "oi_call_put_ratio", "net_premium", "net_premium_share",
+            "unusual_call_count", "unusual_put_count", "strike_hhi"
+        ),
+        "risk_assessment": ("overall_risk", "risk_level", "volatility_risk", "valuation_risk"),
+        "risk_flags": None
+    }
+    
     def __init__(self, llm=None):
         super().__init__("synthesis", llm)
     
     def build_prompt(self, context: dict) -> str:
-        financial = context.get("financial_metrics", {})
-        trend = context.get("trend_signals", {})
-        sentiment = context.get("sentiment_data", {})
-        whale = context.get("whale_activity", {})
+        sections = self.prompt_context(context)
         
         return f"""你是综合合成专家。基于以下所有分析生成最终决策:
 
-财务: {financial}
-趋势: {trend}
-情绪: {sentiment}
-资金: {whale}
+财务: {sections['financial_metrics']}
+趋势: {sections['trend_signals']}
+情绪: {sections['sentiment_data']}
+资金: {sections['whale_activity']}
+风险: {sections['risk_assessment']}
+风险标记: {sections['risk_flags']}
 
 请返回JSON格式:
 {{
@@ -37,7 +51,7 @@ class SynthesisAgent(BaseSubAgent):
     "reasoning_chain": ["推理步骤"],
     "risk_flags": []
 }}"""
-    
+
     def mock_response(self) -> str:
         return """{
     "confidence": 0.78,
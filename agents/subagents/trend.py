@@ -2,34 +2,42 @@
 TrendAnalysisSubAgent - 趋势分析专家
 """
 from .base import BaseSubAgent
+from .prompt_context import FINANCIAL_FIELDS
 
 
 class TrendAnalysisAgent(BaseSubAgent):
     """趋势分析 - 分析历史趋势"""
     
+    config_key = "trend"
+    version = "1.1"
+    prompt_fields = {"financial_metrics": FINANCIAL_FIELDS}
+    batchable = True
+    batch_instruction = "你是趋势分析专家。分别基于以下各股票的财务数据分析趋势"
+    response_format = """{
+    "confidence": 0.82,
+    "key_findings": ["发现"],
+    "structured_data": {
+        "revenue_trend": "UPWARD|DOWNWARD|STABLE",
+        "eps_trend": "UPWARD|DOWNWARD|STABLE",
+        "momentum_score": 0.75
+    },
+    "risk_flags": []
+}"""
+
     def __init__(self, llm=None):
         super().__init__("trend_analysis", llm)
     
     def build_prompt(self, context: dict) -> str:
-        financial = context.get("financial_metrics", {})
+        sections = self.prompt_context(context)
         
         return f"""你是趋势分析专家。基于以下财务数据分析趋势:
 
 财务指标:
-{financial}
+{sections['financial_metrics']}
 
 请返回JSON格式:
-{{
-    "confidence": 0.82,
-    "key_findings": ["发现"],
-    "structured_data": {{
-        "revenue_trend": "UPWARD|DOWNWARD|STABLE",
-        "eps_trend": "UPWARD|DOWNWARD|STABLE",
-        "momentum_score": 0.75
-    }},
-    "risk_flags": []
-}}"""
-    
+{self.response_format}"""
+
     def mock_response(self) -> str:
         return """{
     "confidence": 0.82,
@@ -1,50 +1,79 @@
 """
 WhaleBehaviorSubAgent - 资金流分析
 """
+import time
 from .base import BaseSubAgent
-from tools import get_options_data
+from tools import get_options_data, get_options_data_async
 
 
 class WhaleBehaviorAgent(BaseSubAgent):
-    """资金流分析"""
+    """资金流分析 - 期权链向量化统计 (options_flow), 无 LLM 调用"""
+    
+    config_key = "whale"
+    uses_llm = False
+    datasets = ("options",)
     
     def __init__(self, llm=None):
         super().__init__("whale_behavior", llm)
     
-    def run(self, context: dict) -> dict:
-        """直接使用真实数据"""
-        import time
+    def run(self, context: dict, deadline=None) -> dict:
+        """直接使用真实数据 (无 LLM 调用)"""
+        start = time.time()
+        try:
+            data = get_options_data(context.get("stock", "NVDA"))
+            return self._build_signal(data, start)
+        except Exception as e:
+            return self._whale_error(e)
+    
+    async def run_async(self, context: dict, deadline=None) -> dict:
+        """缓存未命中时, 阻塞的期权链拉取经 get_options_data_async 放到线程池执行 (asyncio.to_thread)"""
         start = time.time()
-        
         try:
-            stock = context.get("stock", "NVDA")
-            data = get_options_chain(stock)
-            
-            signal = "ACCUMULATING"
-            if data.get("calls_heavy"):
-                signal = "ACCUMULATING"
-            elif data.get("call_put_ratio", 1) < 1:
-                signal = "DISTRIBUTING"
-            else:
-                signal = "NEUTRAL"
-            
-            return {
-                "module": "whale_behavior",
-                "confidence": 0.85,
-                "key_findings": [
-                    f"Call/Put比率: {data.get('call_put_ratio', 0)}",
-                    f"期权流向: {'CALLS_HEAVY' if data.get('calls_heavy') else 'PUTS_HEAVY'}"
-                ],
-                "structured_data": data,
-                "risk_flags": [],
-                "latency_ms": int((time.time() - start) * 1000),
-                "tokens_used": 0
-            }
+            data = await get_options_data_async(context.get("stock", "NVDA"))
+            return self._build_signal(data, start)
         except Exception as e:
-            return {
-                "module": "whale_behavior",
-                "confidence": 0.0,
-                "error": str(e),
-                "structured_data": {},
-                "risk_flags": []
-            }
+            return self._whale_error(e)
+    
+    def _build_signal(self, data: dict, start: float) -> dict:
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        
+        key_findings = [
+            f"Call/Put比率: {data.get('call_put_ratio', 0)} (持仓 {data.get('oi_call_put_ratio', 0)})",
+            f"期权流向: {'CALLS_HEAVY' if data.get('calls_heavy') else 'PUTS_HEAVY'} "
+            f"(净权利金 {data.get('net_premium', 0):,.0f})",
+        ]
+        for contract in data.get("unusual_contracts", [])[:3]:
+            key_findings.append(
+                f"异常成交: {contract['type'].upper()} {contract['strike']} {contract['expiration']} "
+                f"量/仓 {contract['vol_oi_ratio']}"
+            )
+        
+        risk_flags = []
+        if data.get("signal") == "DISTRIBUTING":
+            risk_flags.append("options_put_flow")
+        if data.get("unusual_put_count", 0) > data.get("unusual_call_count", 0):
+            risk_flags.append("unusual_put_activity")
+        
+        # 样本越少越不可信
+        contracts = data.get("contracts", 0)
+        confidence = 0.85 if contracts >= 200 else 0.6 if contracts >= 20 else 0.3
+        
+        return {
+            "module": "whale_behavior",
+            "confidence": confidence,
+            "key_findings": key_findings,
+            "structured_data": data,
+            "risk_flags": risk_flags,
+            "latency_ms": int((time.time() - start) * 1000),
+            "tokens_used": 0
+        }
+    
+    def _whale_error(self, e: Exception) -> dict:
+        return {
+            "module": "whale_behavior",
+            "confidence": 0.0,
+            "error": str(e),
+            "structured_data": {},
+            "risk_flags": []
+        }
@@ -0,0 +1,190 @@
+"""
+Cache - 通用缓存组件
+- LRUCache: 线程安全的内存 LRU + TTL
+- DiskCache: SQLite 持久层, 进程重启后仍然有效
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+MISSING = object()
+
+
+class LRUCache:
+    """内存 LRU + TTL (线程安全)"""
+    
+    def __init__(self, max_entries: int = 1024, ttl_s: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+    
+    def get(self, key: str, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return default
+            
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+    
+    def peek(self, key: str, default=MISSING):
+        """读取但不更新 LRU 顺序与命中统计"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+                return default
+            return entry[0]
+    
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None, tag: str = ""):
+        ttl_s = ttl_s if ttl_s is not None else self.ttl_s
+        expires_at = time.time() + ttl_s if ttl_s else None
+        
+        with self._lock:
+            self._data[key] = (value, expires_at, tag)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+    
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+    
+    def delete_tag(self, tag: str) -> int:
+        """删除同一 tag 的所有条目"""
+        with self._lock:
+            keys = [k for k, (_, _, t) in self._data.items() if t == tag]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    SQLite 持久缓存 (JSON 值)
+    WAL 模式, 同一主机上的多个进程可共享
+    首次读写时才创建目录与数据库文件 (模块级全局实例 import 时不落盘)
+    """
+    
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _db(self) -> sqlite3.Connection:
+        """持锁调用; 首次使用时打开连接并建表"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, tag TEXT NOT NULL DEFAULT '', "
+                "created_at REAL NOT NULL, expires_at REAL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_tag ON {self.table}(tag)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    def get(self, key: str, default=MISSING):
+        entry = self.get_entry(key)
+        return default if entry is MISSING else entry[0]
+    
+    def get_entry(self, key: str, default=MISSING):
+        """返回 (value, expires_at); 上层回填内存层时按剩余有效期设置 TTL"""
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        if row[1] is not None and row[1] <= time.time():
+            self.delete(key)
+            return default
+        return json.loads(row[0]), row[1]
+    
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None, tag: str = ""):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, tag, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False, default=str), tag, now,
+                 now + ttl_s if ttl_s else None)
+            )
+            db.commit()
+    
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            db = self._db()
+            cur = db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            db.commit()
+            return cur.rowcount > 0
+    
+    def delete_tag(self, tag: str) -> int:
+        with self._lock:
+            db = self._db()
+            cur = db.execute(f"DELETE FROM {self.table} WHERE tag = ?", (tag,))
+            db.commit()
+            return cur.rowcount
+    
+    def purge_expired(self) -> int:
+        with self._lock:
+            db = self._db()
+            cur = db.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),)
+            )
+            db.commit()
+            return cur.rowcount
+    
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            db.execute(f"DELETE FROM {self.table}")
+            db.commit()
+    
+    def __len__(self):
+        with self._lock:
+            db = self._db()
+            return db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
@@ -0,0 +1,31 @@
+"""
+Config - configs/*.yaml 加载
+"""
+import os
+from functools import lru_cache
+from typing import Dict, Any
+
+import yaml
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configs")
+
+
+@lru_cache(maxsize=None)
+def load_config(name: str) -> Dict[str, Any]:
+    """加载 configs/<name>.yaml (进程内缓存, 调用方不要修改返回值)"""
+    path = os.path.join(CONFIG_DIR, f"{name}.yaml")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_llm_config() -> Dict[str, Any]:
+    """LLM配置"""
+    return load_config("llm_config")
+
+
+def load_agent_config() -> Dict[str, Any]:
+    """Agent配置"""
+    return load_config("agent_config")
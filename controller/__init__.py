@@ -1,7 +1,12 @@
 """
 Controller - 导出
 """
-from .scheduler import Scheduler, TaskQueue
-from .persistence import ResultStorage
+from .scheduler import Scheduler, TaskQueue, create_task_queue
+from .durable_queue import SQLiteTaskQueue
+from .persistence import ResultStorage, StorageBackend, SQLiteBackend
+from .batch import run_batch
 
-__all__ = ["Scheduler", "TaskQueue", "ResultStorage"]
+__all__ = [
+    "Scheduler", "TaskQueue", "SQLiteTaskQueue", "create_task_queue",
+    "ResultStorage", "StorageBackend", "SQLiteBackend", "run_batch"
+]
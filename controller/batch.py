@@ -0,0 +1,105 @@
+"""
+Batch - 批量分析
+- asyncio.Semaphore 限制同时进行的分析数
+- 开始前一次性预取全部 ticker 的行情数据, 各分析共享 market_cache 与 LLM 后端
+- 单个失败不影响其它, 返回逐项状态与耗时
+- 批量 token 预算: 每项分析使用其子预算, 剩余不足 min_analysis 时后续项标记为 skipped
+- 多股票合并 prompt: sentiment/trend/risk 的同类调用合并为一次 LLM 请求 (agents/subagents/prompt_batch.py)
+"""
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from agents.subagents.prompt_batch import PromptBatcher, batching
+from config import load_agent_config
+from market_cache import load_data_config
+from tokens import TokenBudget, load_token_config
+from tools import prefetch_market_data_async, PREFETCH_DATASETS
+
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MIN_ANALYSIS_TOKENS = 4000
+
+
+def load_batch_config() -> Dict[str, Any]:
+    return load_agent_config().get("agents", {}).get("batch", {}) or {}
+
+
+async def _prefetch(tickers: List[str]) -> Dict[str, Any]:
+    config = load_data_config().get("market_data", {}).get("prefetch", {}) or {}
+    return await prefetch_market_data_async(
+        tickers,
+        datasets=config.get("datasets", PREFETCH_DATASETS),
+        max_workers=config.get("max_workers", 8)
+    )
+
+
+async def run_batch(agent, items: List[Dict[str, Any]], max_concurrency: Optional[int] = None,
+                    prefetch: Optional[bool] = None,
+                    on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+                    token_budget: Optional[int] = None) -> Dict[str, Any]:
+    """
+    批量分析
+    items: [{"stock", "quarter", "raw_text", "actual_data"}]
+    on_result: 单项成功后的回调 (item, result), 在线程池执行 (如持久化)
+    token_budget: 整个批量的 token 上限 (默认 agents.tokens.batch_budget, 0 为不限)
+    """
+    config = load_batch_config()
+    max_concurrency = max_concurrency or config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+    prefetch = config.get("prefetch", True) if prefetch is None else prefetch
+    start = time.time()
+    
+    prefetch_report = None
+    if prefetch and items:
+        tickers = [item["stock"] for item in items]
+        try:
+            prefetch_report = await _prefetch(tickers)
+        except Exception as e:
+            # 预取失败不影响分析, 各 SubAgent 会按需拉取
+            prefetch_report = {"error": str(e)}
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tokens = TokenBudget.for_batch(token_budget)
+    min_analysis = load_token_config().get("min_analysis", DEFAULT_MIN_ANALYSIS_TOKENS)
+    dispatched = time.time()
+    
+    async def run_one(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            item_start = time.time()
+            entry = {"index": index, "stock": item["stock"], "quarter": item.get("quarter", "Q4 2025")}
+            try:
+                if not tokens.fits(min_analysis):
+                    entry.update(status="skipped", error="token budget exhausted")
+                else:
+                    result = await agent.analyze_async(
+                        item["stock"], entry["quarter"], item.get("raw_text", ""), item.get("actual_data"),
+                        token_budget=TokenBudget.for_analysis(parent=tokens)
+                    )
+                    if on_result:
+                        await asyncio.to_thread(on_result, item, result)
+                    entry.update(status="success", result=result)
+            except Exception as e:
+                entry.update(status="error", error=str(e))
+            entry["elapsed_ms"] = int((time.time() - item_start) * 1000)
+            entry["queued_ms"] = int((item_start - dispatched) * 1000)
+            return entry
+    
+    batcher = PromptBatcher.from_config() if len(items) > 1 else None
+    with batching(batcher):
+        results = await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+    succeeded = sum(1 for r in results if r["status"] == "success")
+    skipped = sum(1 for r in results if r["status"] == "skipped")
+    
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded - skipped,
+        "skipped": skipped,
+        "max_concurrency": max_concurrency,
+        "elapsed_ms": int((time.time() - start) * 1000),
+        "total_tokens": tokens.used,
+        "token_budget": tokens.describe(),
+        "prefetch": prefetch_report,
+        "prompt_batch": batcher.describe() if batcher else None,
+        "items": results
+    }
@@ -0,0 +1,301 @@
+"""
+Durable Queue - SQLite 持久任务队列
+- 进程崩溃/重启后未完成的任务继续执行
+- 租约 (visibility timeout): 取出的任务在租约内对其它 worker 不可见, 超时未完成则重新投递
+- 每次认领生成 lease_token; mark_done/mark_failed/extend_lease 只对仍持有租约的 worker 生效,
+  租约过期后迟到的 worker 不会覆盖重新认领者的结果
+- 失败按指数退避重试 (agent_config.yaml -> agents.retry), 超过次数进入死信 (dead)
+- BEGIN IMMEDIATE 认领, 同一主机多个调度进程可安全共享
+接口与 TaskQueue 相同 (add/get/mark_done/mark_failed/get_task/wakeup/close/stats)
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+from config import load_agent_config
+
+
+def load_retry_config() -> Dict[str, Any]:
+    return load_agent_config().get("agents", {}).get("retry", {}) or {}
+
+
+class SQLiteTaskQueue:
+    """SQLite 持久任务队列 (priority 越大越先执行)"""
+    
+    def __init__(self, path: str = "./storage/tasks.db", visibility_timeout_s: float = 120.0,
+                 max_attempts: Optional[int] = None, backoff_ms: Optional[int] = None,
+                 max_backoff_ms: int = 60000, poll_interval_s: float = 0.5):
+        retry = load_retry_config()
+        self.path = path
+        self.visibility_timeout_s = visibility_timeout_s
+        self.max_attempts = max_attempts or retry.get("max_attempts", 2)
+        self.backoff_ms = backoff_ms if backoff_ms is not None else retry.get("backoff_ms", 1000)
+        self.max_backoff_ms = max_backoff_ms
+        self.poll_interval_s = poll_interval_s
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        # 本进程内 add 时唤醒等待者; 其它进程的新任务靠轮询发现
+        self._cond = threading.Condition()
+        self._closed = False
+        self._wakeups = 0
+        
+        # isolation_level=None: 事务由 BEGIN IMMEDIATE / COMMIT 显式控制
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT NOT NULL UNIQUE, "
+            "priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "available_at REAL NOT NULL, lease_until REAL, lease_token TEXT, error TEXT, result TEXT, "
+            "created_at TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "lease_token" not in columns:
+            # 旧版队列文件补列; 进行中的任务租约过期后按新 token 重新认领
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN lease_token TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks(status, priority DESC, seq)"
+        )
+    
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """写语句 (自动提交), 返回影响行数"""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+    
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    def add(self, task: Dict, priority: int = 0) -> str:
+        """添加任务"""
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        self._execute(
+            "INSERT INTO tasks (task_id, priority, status, payload, max_attempts, available_at, "
+            "created_at, updated_at) VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)",
+            (task_id, priority, json.dumps(task, ensure_ascii=False, default=str),
+             self.max_attempts, now, datetime.now().isoformat(), now)
+        )
+        task.update(task_id=task_id, status="pending", priority=priority)
+        with self._cond:
+            self._cond.notify()
+        return task_id
+    
+    def _claim(self) -> Optional[Dict]:
+        """
+        认领一个可执行任务: 到期的 pending, 或租约已过期的 running (worker 崩溃)
+        租约过期且已用完重试次数的任务直接进入死信
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT task_id, priority, status, payload, attempts, max_attempts, created_at "
+                        "FROM tasks WHERE (status = 'pending' AND available_at <= ?) "
+                        "OR (status = 'running' AND lease_until <= ?) "
+                        "ORDER BY priority DESC, seq LIMIT 1",
+                        (now, now)
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    
+                    task_id, priority, status, payload, attempts, max_attempts, created_at = row
+                    if status == "running" and attempts >= max_attempts:
+                        self._conn.execute(
+                            "UPDATE tasks SET status = 'dead', error = ?, lease_until = NULL, lease_token = NULL, "
+                            "updated_at = ? WHERE task_id = ?",
+                            ("lease expired", now, task_id)
+                        )
+                        continue
+                    
+                    lease_token = uuid.uuid4().hex
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                        "lease_token = ?, updated_at = ? WHERE task_id = ?",
+                        (now + self.visibility_timeout_s, lease_token, now, task_id)
+                    )
+                    self._conn.execute("COMMIT")
+                    break
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        task = json.loads(payload)
+        task.update(
+            task_id=task_id, status="running", priority=priority, attempts=attempts + 1,
+            lease_token=lease_token, created_at=created_at, started_at=datetime.now().isoformat()
+        )
+        return task
+    
+    def _next_available_in(self) -> Optional[float]:
+        """距最近一个延迟任务 (退避中/租约中) 可执行的秒数"""
+        row = self._query(
+            "SELECT MIN(CASE status WHEN 'pending' THEN available_at ELSE lease_until END) "
+            "FROM tasks WHERE status IN ('pending', 'running')"
+        )[0]
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+    
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        认领一个任务 (status=running, 带租约)
+        队列为空时阻塞, 超时、wakeup 或队列关闭时返回 None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            wakeups = self._wakeups
+        
+        while True:
+            task = self._claim()
+            if task:
+                return task
+            
+            wait = self.poll_interval_s
+            next_in = self._next_available_in()
+            if next_in is not None:
+                wait = min(wait, next_in)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                wait = min(wait, remaining)
+            
+            with self._cond:
+                if self._closed or self._wakeups != wakeups:
+                    return None
+                self._cond.wait(wait)
+    
+    @staticmethod
+    def _owner(task_id: str, lease_token: Optional[str]) -> tuple:
+        """WHERE 条件: 任务仍在运行, 且给出 lease_token 时租约仍归调用方"""
+        if lease_token is None:
+            return "task_id = ? AND status = 'running'", (task_id,)
+        return "task_id = ? AND status = 'running' AND lease_token = ?", (task_id, lease_token)
+    
+    def extend_lease(self, task_id: str, seconds: Optional[float] = None,
+                     lease_token: Optional[str] = None) -> bool:
+        """长任务续租; 租约已被其它 worker 接手时返回 False"""
+        now = time.time()
+        where, params = self._owner(task_id, lease_token)
+        return self._execute(
+            f"UPDATE tasks SET lease_until = ?, updated_at = ? WHERE {where}",
+            (now + (seconds or self.visibility_timeout_s), now, *params)
+        ) > 0
+    
+    def mark_done(self, task_id: str, result: Dict, lease_token: Optional[str] = None) -> bool:
+        """标记完成; 租约已过期并被重新认领时不写入, 返回 False"""
+        where, params = self._owner(task_id, lease_token)
+        return self._execute(
+            "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_until = NULL, lease_token = NULL, "
+            f"updated_at = ? WHERE {where}",
+            (json.dumps(result, ensure_ascii=False, default=str), time.time(), *params)
+        ) > 0
+    
+    def mark_failed(self, task_id: str, error: str, lease_token: Optional[str] = None) -> bool:
+        """
+        标记失败: 未超过 max_attempts 时按指数退避重新排队, 否则进入死信
+        租约已过期并被重新认领时不改动, 返回 False
+        """
+        now = time.time()
+        where, params = self._owner(task_id, lease_token)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT attempts, max_attempts FROM tasks WHERE {where}", params
+                ).fetchone()
+                if row is not None and row[0] >= row[1]:
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'dead', error = ?, lease_until = NULL, lease_token = NULL, "
+                        "updated_at = ? WHERE task_id = ?",
+                        (error, now, task_id)
+                    )
+                elif row is not None:
+                    delay_ms = min(self.backoff_ms * 2 ** (row[0] - 1), self.max_backoff_ms)
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'pending', error = ?, lease_until = NULL, lease_token = NULL, "
+                        "available_at = ?, updated_at = ? WHERE task_id = ?",
+                        (error, now + delay_ms / 1000, now, task_id)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row is not None
+    
+    def requeue(self, task_id: str) -> bool:
+        """死信任务重新投递 (重置重试次数)"""
+        now = time.time()
+        requeued = self._execute(
+            "UPDATE tasks SET status = 'pending', attempts = 0, available_at = ?, updated_at = ? "
+            "WHERE task_id = ? AND status = 'dead'",
+            (now, now, task_id)
+        ) > 0
+        if requeued:
+            with self._cond:
+                self._cond.notify()
+        return requeued
+    
+    def _to_task(self, row: tuple) -> Dict:
+        task_id, priority, status, payload, attempts, error, result, created_at = row
+        task = json.loads(payload)
+        task.update(task_id=task_id, priority=priority, status=status, attempts=attempts,
+                    created_at=created_at)
+        if error:
+            task["error"] = error
+        if result:
+            task["result"] = json.loads(result)
+        return task
+    
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        rows = self._query(
+            "SELECT task_id, priority, status, payload, attempts, error, result, created_at "
+            "FROM tasks WHERE task_id = ?", (task_id,)
+        )
+        return self._to_task(rows[0]) if rows else None
+    
+    def dead_letters(self, limit: int = 100) -> List[Dict]:
+        rows = self._query(
+            "SELECT task_id, priority, status, payload, attempts, error, result, created_at "
+            "FROM tasks WHERE status = 'dead' ORDER BY seq DESC LIMIT ?", (limit,)
+        )
+        return [self._to_task(row) for row in rows]
+    
+    def purge(self, older_than_s: float = 7 * 86400) -> int:
+        """删除早于 older_than_s 完成的任务"""
+        return self._execute(
+            "DELETE FROM tasks WHERE status = 'done' AND updated_at < ?", (time.time() - older_than_s,)
+        )
+    
+    def wakeup(self):
+        """唤醒所有等待中的 get (返回 None)"""
+        with self._cond:
+            self._wakeups += 1
+            self._cond.notify_all()
+    
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def stats(self) -> Dict[str, int]:
+        rows = self._query("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        counts = {"pending": 0, "running": 0, "done": 0, "dead": 0}
+        counts.update(dict(rows))
+        return counts
+    
+    def __len__(self):
+        return self.stats()["pending"]
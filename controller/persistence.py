@@ -1,33 +1,265 @@
 """
 Persistence - 结果持久化
+- 可插拔存储后端 (默认 SQLite, 单文件嵌入式)
+- 追加写 O(1), 按 stock/quarter/timestamp 建索引
+- 每次写入一个事务 (原子), WAL 模式允许读写并发
+- 首次启动时自动迁移旧的 results.json (导入与完成标记同一事务, 中途崩溃不会重复导入)
+- 分页查询: 基于 seq 的游标分页 + 过滤 + 字段投影, 逐行流式读取
 """
 import json
 import os
-from typing import Dict, Any, List
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
 
 
+SUMMARY_FIELDS = "summary"
+FULL_FIELDS = "full"
+
+
+def summarize(record: Dict[str, Any]) -> Dict[str, Any]:
+    """记录摘要 - 不含 memory 等大字段, 用于列表/历史查询"""
+    analysis = record.get("result") or {}
+    synthesis = analysis.get("result") or {}
+    decision = synthesis.get("structured_data") or {}
+    return {
+        "id": record.get("id"),
+        "stock": record.get("stock"),
+        "quarter": record.get("quarter"),
+        "timestamp": record.get("timestamp"),
+        "recommendation": decision.get("recommendation"),
+        "overall_score": decision.get("overall_score"),
+        "target_price": decision.get("target_price"),
+        "confidence": synthesis.get("confidence"),
+        "key_findings": synthesis.get("key_findings", []),
+        "execution_time_ms": analysis.get("execution_time_ms"),
+        "total_tokens": analysis.get("total_tokens")
+    }
+
+
+class StorageBackend:
+    """存储后端接口"""
+    
+    def append(self, record: Dict[str, Any]):
+        raise NotImplementedError
+    
+    def append_many(self, records: List[Dict[str, Any]]):
+        for record in records:
+            self.append(record)
+    
+    def import_once(self, source: str, records: List[Dict[str, Any]]) -> bool:
+        """一次性导入 source 的记录; 已导入过返回 False (默认实现不记录, 每次都导入)"""
+        self.append_many(records)
+        return True
+    
+    def iter_records(self, stock: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """按写入顺序逐条返回"""
+        raise NotImplementedError
+    
+    def latest(self, stock: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    def count(self, stock: Optional[str] = None) -> int:
+        raise NotImplementedError
+    
+    def query(self, filters: Dict[str, Any], fields: str = FULL_FIELDS,
+              before: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """按 seq 倒序逐条返回 (seq, 记录), 只返回 seq < before 的记录"""
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite 存储 - 结果 JSON 存 payload 列, 查询列单独建索引"""
+    
+    SCHEMA_VERSION = 3
+    FETCH_SIZE = 200
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+    
+    def _migrate(self):
+        """按 PRAGMA user_version 逐级升级表结构"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        steps = {0: self._create_schema, 1: self._add_summary_columns, 2: self._create_imports}
+        while version < self.SCHEMA_VERSION:
+            with self._conn:
+                steps[version]()
+                version += 1
+                self._conn.execute(f"PRAGMA user_version = {version}")
+    
+    def _create_schema(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, "
+            "stock TEXT NOT NULL, quarter TEXT NOT NULL, timestamp TEXT NOT NULL, "
+            "payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_stock ON results(stock, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_quarter ON results(quarter, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results(timestamp)")
+    
+    def _add_summary_columns(self):
+        """v2: recommendation (可过滤) + summary (摘要投影, 不必解析 payload)"""
+        self._conn.execute("ALTER TABLE results ADD COLUMN recommendation TEXT")
+        self._conn.execute("ALTER TABLE results ADD COLUMN summary TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_recommendation ON results(recommendation, seq)"
+        )
+        
+        rows = self._conn.execute("SELECT seq, payload FROM results")
+        while True:
+            batch = rows.fetchmany(self.FETCH_SIZE)
+            if not batch:
+                break
+            updates = []
+            for seq, payload in batch:
+                summary = summarize(json.loads(payload))
+                updates.append((summary["recommendation"], json.dumps(summary, ensure_ascii=False), seq))
+            self._conn.executemany(
+                "UPDATE results SET recommendation = ?, summary = ? WHERE seq = ?", updates
+            )
+    
+    def _create_imports(self):
+        """v3: 已完成的一次性导入 (如 results.json), 与导入的记录同一事务写入"""
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS imports ("
+            "source TEXT PRIMARY KEY, records INTEGER NOT NULL, imported_at TEXT NOT NULL)"
+        )
+    
+    @staticmethod
+    def _row(record: Dict[str, Any]) -> tuple:
+        summary = summarize(record)
+        return (
+            record["id"], record["stock"], record["quarter"], record["timestamp"],
+            json.dumps(record, ensure_ascii=False, default=str),
+            summary["recommendation"], json.dumps(summary, ensure_ascii=False, default=str)
+        )
+    
+    def append(self, record: Dict[str, Any]):
+        self.append_many([record])
+    
+    def append_many(self, records: List[Dict[str, Any]]):
+        """单个事务写入, 要么全部成功要么全部回滚"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO results (id, stock, quarter, timestamp, payload, recommendation, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._row(r) for r in records]
+            )
+    
+    def import_once(self, source: str, records: List[Dict[str, Any]]) -> bool:
+        """记录与 imports 标记在同一事务提交; 已有标记时不再导入"""
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone():
+                return False
+            self._conn.executemany(
+                "INSERT INTO results (id, stock, quarter, timestamp, payload, recommendation, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._row(r) for r in records]
+            )
+            self._conn.execute(
+                "INSERT INTO imports (source, records, imported_at) VALUES (?, ?, ?)",
+                (source, len(records), datetime.now().isoformat())
+            )
+        return True
+    
+    def _stream(self, sql: str, params: tuple) -> Iterator[tuple]:
+        """独立只读连接 + fetchmany 分批读取; WAL 下不阻塞写入, 也不占用写锁"""
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.FETCH_SIZE)
+                if not rows:
+                    return
+                yield from rows
+    
+    def iter_records(self, stock: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if stock:
+            sql, params = "SELECT payload FROM results WHERE stock = ? ORDER BY seq", (stock,)
+        else:
+            sql, params = "SELECT payload FROM results ORDER BY seq", ()
+        for (payload,) in self._stream(sql, params):
+            yield json.loads(payload)
+    
+    def query(self, filters: Dict[str, Any], fields: str = FULL_FIELDS,
+              before: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        column = "summary" if fields == SUMMARY_FIELDS else "payload"
+        clauses, params = [], []
+        for name in ("stock", "quarter", "recommendation"):
+            if filters.get(name):
+                clauses.append(f"{name} = ?")
+                params.append(filters[name])
+        if filters.get("since"):
+            clauses.append("timestamp >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            clauses.append("timestamp <= ?")
+            params.append(filters["until"])
+        if before is not None:
+            clauses.append("seq < ?")
+            params.append(before)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT seq, {column} FROM results {where} ORDER BY seq DESC"
+        for seq, value in self._stream(sql, tuple(params)):
+            yield seq, json.loads(value)
+    
+    def latest(self, stock: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM results WHERE stock = ? ORDER BY seq DESC LIMIT 1", (stock,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def count(self, stock: Optional[str] = None) -> int:
+        with self._lock:
+            if stock:
+                return self._conn.execute(
+                    "SELECT COUNT(*) FROM results WHERE stock = ?", (stock,)
+                ).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 class ResultStorage:
-    """结果存储 - JSON文件"""
+    """结果存储 - 接口不变 (save/get_all/get_latest), 后端可替换"""
     
-    def __init__(self, storage_path: str = "./storage"):
+    def __init__(self, storage_path: str = "./storage", backend: Optional[StorageBackend] = None):
         self.storage_path = storage_path
         os.makedirs(storage_path, exist_ok=True)
         self.results_file = f"{storage_path}/results.json"
-        self._load()
+        self.backend = backend or SQLiteBackend(f"{storage_path}/results.db")
+        self._migrate_json()
     
-    def _load(self):
-        """加载数据"""
-        if os.path.exists(self.results_file):
-            with open(self.results_file, 'r') as f:
-                self.results = json.load(f)
+    def _migrate_json(self):
+        """
+        旧版 results.json 一次性导入, 完成后改名为 results.json.migrated
+        导入在改名前崩溃时, 下次启动由后端的导入标记跳过, 只补做改名
+        """
+        if not os.path.exists(self.results_file):
+            return
+        
+        with open(self.results_file, 'r') as f:
+            records = json.load(f) or []
+        imported = self.backend.import_once(os.path.basename(self.results_file), records)
+        os.replace(self.results_file, f"{self.results_file}.migrated")
+        if imported:
+            print(f"[Storage] Migrated {len(records)} records from {self.results_file}")
         else:
-            self.results = []
-    
-    def _save(self):
-        """保存数据"""
-        with open(self.results_file, 'w') as f:
-            json.dump(self.results, f, indent=2)
+            print(f"[Storage] {self.results_file} already imported, renamed only")
     
     def save(self, stock: str, quarter: str, result: Dict):
         """保存结果"""
@@ -38,18 +270,43 @@ class ResultStorage:
             "timestamp": datetime.now().isoformat(),
             "result": result
         }
-        self.results.append(record)
-        self._save()
+        self.backend.append(record)
     
     def get_all(self, stock: str = None) -> List[Dict]:
         """获取所有结果"""
-        if stock:
-            return [r for r in self.results if r.get("stock") == stock]
-        return self.results
+        return list(self.backend.iter_records(stock))
     
     def get_latest(self, stock: str) -> Dict:
         """获取最新结果"""
-        stock_results = self.get_all(stock)
-        if stock_results:
-            return stock_results[-1]
-        return None
+        return self.backend.latest(stock)
+    
+    def count(self, stock: str = None) -> int:
+        return self.backend.count(stock)
+    
+    def page(self, stock: str = None, quarter: str = None, since: str = None, until: str = None,
+             recommendation: str = None, fields: str = FULL_FIELDS, cursor: str = None,
+             limit: int = 50) -> Dict[str, Any]:
+        """
+        游标分页 (最新在前)
+        cursor 为上一页返回的 next_cursor; 只读取 limit + 1 行, 内存与历史总量无关
+        since/until 为 ISO 时间, 只给日期时 until 包含当天
+        """
+        if until and len(until) == 10:
+            until = f"{until}T23:59:59.999999"
+        filters = {
+            "stock": stock, "quarter": quarter, "since": since, "until": until,
+            "recommendation": recommendation.upper() if recommendation else None
+        }
+        before = int(cursor) if cursor else None
+        
+        results, last_seq, next_cursor = [], None, None
+        for seq, record in self.backend.query(filters, fields, before):
+            if len(results) == limit:
+                next_cursor = str(last_seq)
+                break
+            results.append(record)
+            last_seq = seq
+        return {"count": len(results), "results": results, "next_cursor": next_cursor}
+    
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,144 @@
+"""
+Premarket - 盘前预热行情缓存 (data_config.yaml -> market_data.premarket)
+- 按财报日历取未来 days 天发布财报的 ticker (市值过滤与 Controller 一致)
+- 每日运行 (run_at) 前 lead_minutes 预取报价/基本面/期权/SEC filings, 写入 market_cache 磁盘层
+- 预取条目至少保留到 run_at + hold_minutes, 早上的运行进程直接命中
+- 报告预热前后各数据集的缓存覆盖率
+
+用法:
+    python3.12 -m controller.premarket            # 立即预热
+    python3.12 -m controller.premarket --wait     # 等到 run_at - lead_minutes 再预热
+    python3.12 -m controller.premarket --check    # 只报告覆盖率
+"""
+import time
+import json
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from earnings_calendar import get_upcoming_earnings
+from market_cache import market_cache, load_data_config
+from tools import prefetch_market_data
+
+
+DEFAULT_DATASETS = ("quote", "fundamentals", "options", "filings")
+
+
+def load_premarket_config() -> Dict[str, Any]:
+    return load_data_config().get("market_data", {}).get("premarket", {}) or {}
+
+
+def premarket_tickers(days: Optional[int] = None, min_market_cap: Optional[float] = None) -> List[str]:
+    """未来 days 天内发布财报且市值达标的 ticker (按财报日期)"""
+    config = load_premarket_config()
+    days = days if days is not None else config.get("days", 14)
+    min_market_cap = min_market_cap if min_market_cap is not None else config.get("min_market_cap", 10e9)
+    earnings = get_upcoming_earnings(days)
+    return list(dict.fromkeys(e["stock"] for e in earnings if e.get("market_cap", 0) > min_market_cap))
+
+
+def next_run(run_at: str, now: Optional[datetime] = None) -> datetime:
+    """下一次每日运行时间 (今天的 run_at 已过则为明天)"""
+    now = now or datetime.now()
+    hour, minute = (int(x) for x in run_at.split(":"))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return run if run > now else run + timedelta(days=1)
+
+
+def coverage(tickers: Iterable[str], datasets: Iterable[str] = DEFAULT_DATASETS) -> Dict[str, Any]:
+    """各数据集已缓存 (未过期) 的 ticker 占比"""
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    report, warm_total = {}, 0
+    for dataset in datasets:
+        cold = [t for t in tickers if not market_cache.contains(dataset, t)]
+        warm = len(tickers) - len(cold)
+        warm_total += warm
+        report[dataset] = {
+            "warm": warm,
+            "coverage": round(warm / len(tickers) * 100, 1) if tickers else 100.0,
+            "cold": cold
+        }
+    slots = len(tickers) * len(report)
+    return {
+        "tickers": len(tickers),
+        "coverage": round(warm_total / slots * 100, 1) if slots else 100.0,
+        "datasets": report
+    }
+
+
+def warm_caches(days: Optional[int] = None, datasets: Optional[Iterable[str]] = None,
+                run: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    预热: 预取未来 days 天的财报 ticker, 并把条目保留到运行窗口结束
+    run: 本次服务的运行时间 (默认下一次 run_at)
+    """
+    config = load_premarket_config()
+    datasets = list(datasets or config.get("datasets", DEFAULT_DATASETS))
+    run = run or next_run(config.get("run_at", "07:00"))
+    hold_until = run + timedelta(minutes=config.get("hold_minutes", 120))
+    tickers = premarket_tickers(days)
+    start = time.time()
+    
+    before = coverage(tickers, datasets)
+    prefetch = prefetch_market_data(tickers, datasets=datasets, max_workers=config.get("max_workers", 8))
+    held = sum(
+        market_cache.hold(dataset, ticker, hold_until.timestamp())
+        for dataset in datasets for ticker in tickers
+    )
+    after = coverage(tickers, datasets)
+    
+    return {
+        "tickers": tickers,
+        "run_at": run.isoformat(timespec="minutes"),
+        "hold_until": hold_until.isoformat(timespec="minutes"),
+        "before": before,
+        "after": after,
+        "prefetch": prefetch["datasets"],
+        "held": held,
+        "elapsed_ms": int((time.time() - start) * 1000)
+    }
+
+
+def wait_for_window(run: datetime, lead_minutes: float):
+    """阻塞到 run - lead_minutes (已过则立即返回)"""
+    delay = (run - timedelta(minutes=lead_minutes) - datetime.now()).total_seconds()
+    if delay > 0:
+        print(f"[Premarket] waiting {int(delay)}s until {lead_minutes}min before {run:%H:%M}")
+        time.sleep(delay)
+
+
+def print_coverage(title: str, report: Dict[str, Any]):
+    print(f"{title}: {report['coverage']}% of {report['tickers']} tickers")
+    for dataset, row in report["datasets"].items():
+        cold = f"  cold: {', '.join(row['cold'][:10])}" if row["cold"] else ""
+        print(f"  {dataset:<13} {row['warm']:>4}/{report['tickers']} ({row['coverage']}%){cold}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Premarket cache warm-up from the earnings calendar")
+    parser.add_argument("--days", type=int, default=None, help="未来 N 天发布财报的 ticker (默认 premarket.days)")
+    parser.add_argument("--wait", action="store_true", help="等到 run_at - lead_minutes 再预热")
+    parser.add_argument("--check", action="store_true", help="只报告覆盖率, 不预取")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+    
+    config = load_premarket_config()
+    if args.check:
+        datasets = config.get("datasets", DEFAULT_DATASETS)
+        report = coverage(premarket_tickers(args.days), datasets)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_coverage("[Premarket] cache coverage", report)
+    else:
+        run = next_run(config.get("run_at", "07:00"))
+        if args.wait:
+            wait_for_window(run, config.get("lead_minutes", 60))
+        report = warm_caches(days=args.days, run=run)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(f"[Premarket] {len(report['tickers'])} tickers for run at {report['run_at']}, "
+                  f"held until {report['hold_until']} ({report['elapsed_ms']}ms)")
+            print_coverage("  before", report["before"])
+            print_coverage("  after", report["after"])
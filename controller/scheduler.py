@@ -3,60 +3,152 @@ Controller - 调度器
 外部Controller只负责调度，不参与认知
 """
 import uuid
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from config import load_agent_config
+
+
+def load_scheduler_config() -> Dict[str, Any]:
+    return load_agent_config().get("agents", {}).get("scheduler", {}) or {}
+
 
 class TaskQueue:
-    """任务队列"""
+    """
+    任务队列 - 堆 + 索引
+    - 按 (优先级, 提交顺序) 出队, priority 越大越先执行
+    - task_id -> task 索引, mark_done/mark_failed O(1)
+    - get 阻塞等待 (Condition), 不忙等
+    - 完成的任务移入有界归档, 超出上限淘汰最早的
+    """
     
-    def __init__(self):
-        self.queue: List[Dict] = []
+    def __init__(self, max_finished: int = 1000):
+        self.max_finished = max_finished
+        self._heap: List[tuple] = []
+        self._tasks: Dict[str, Dict] = {}
+        self._finished: "OrderedDict[str, Dict]" = OrderedDict()
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._wakeups = 0
     
-    def add(self, task: Dict) -> str:
+    def add(self, task: Dict, priority: int = 0) -> str:
         """添加任务"""
         task_id = str(uuid.uuid4())
         task["task_id"] = task_id
         task["status"] = "pending"
+        task["priority"] = priority
         task["created_at"] = datetime.now().isoformat()
-        self.queue.append(task)
+        
+        with self._cond:
+            self._tasks[task_id] = task
+            heapq.heappush(self._heap, (-priority, next(self._counter), task_id))
+            self._cond.notify()
         return task_id
     
-    def get(self) -> Optional[Dict]:
-        """获取任务"""
-        for task in self.queue:
-            if task.get("status") == "pending":
-                return task
-        return None
-    
-    def mark_done(self, task_id: str, result: Dict):
-        """标记完成"""
-        for task in self.queue:
-            if task.get("task_id") == task_id:
-                task["status"] = "done"
-                task["result"] = result
-                task["completed_at"] = datetime.now().isoformat()
-                break
-    
-    def mark_failed(self, task_id: str, error: str):
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        取出优先级最高的任务并标记为 running
+        队列为空时阻塞, 超时、wakeup 或队列关闭时返回 None
+        """
+        with self._cond:
+            wakeups = self._wakeups
+            while True:
+                while self._heap:
+                    _, _, task_id = heapq.heappop(self._heap)
+                    task = self._tasks.get(task_id)
+                    if task and task["status"] == "pending":
+                        task["status"] = "running"
+                        task["started_at"] = datetime.now().isoformat()
+                        return task
+                if self._closed or self._wakeups != wakeups:
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+    
+    def _finish(self, task_id: str, **fields):
+        with self._cond:
+            task = self._tasks.pop(task_id, None)
+            if task is None:
+                return
+            task.update(fields)
+            self._finished[task_id] = task
+            while len(self._finished) > self.max_finished:
+                self._finished.popitem(last=False)
+    
+    def mark_done(self, task_id: str, result: Dict, lease_token: Optional[str] = None):
+        """标记完成 (内存队列没有租约, lease_token 忽略)"""
+        self._finish(task_id, status="done", result=result, completed_at=datetime.now().isoformat())
+    
+    def mark_failed(self, task_id: str, error: str, lease_token: Optional[str] = None):
         """标记失败"""
-        for task in self.queue:
-            if task.get("task_id") == task_id:
-                task["status"] = "failed"
-                task["error"] = error
-                break
+        self._finish(task_id, status="failed", error=error, completed_at=datetime.now().isoformat())
+    
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        """按 task_id 查询 (进行中或已归档)"""
+        with self._cond:
+            return self._tasks.get(task_id) or self._finished.get(task_id)
+    
+    def wakeup(self):
+        """唤醒所有等待中的 get (返回 None)"""
+        with self._cond:
+            self._wakeups += 1
+            self._cond.notify_all()
+    
+    def close(self):
+        """关闭队列: 等待中的 get 立即返回 None"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            running = sum(1 for t in self._tasks.values() if t["status"] == "running")
+            return {
+                "pending": len(self._tasks) - running,
+                "running": running,
+                "finished": len(self._finished)
+            }
+    
+    def __len__(self):
+        return self.stats()["pending"]
+
+
+def create_task_queue(config: Optional[Dict[str, Any]] = None):
+    """按配置创建任务队列: memory (默认) / sqlite (持久, 支持重试与多进程)"""
+    config = config if config is not None else load_scheduler_config()
+    if config.get("queue", "memory") == "sqlite":
+        from .durable_queue import SQLiteTaskQueue
+        return SQLiteTaskQueue(
+            path=config.get("queue_path", "./storage/tasks.db"),
+            visibility_timeout_s=config.get("visibility_timeout_s", 120)
+        )
+    return TaskQueue(max_finished=config.get("max_finished", 1000))
 
 
 class Scheduler:
     """
     调度器 - 极简版
     只负责: 调度、存储、重试
+    start(workers=N) 启动 N 个工作线程并发消费队列, stop() 停止
+    queue 可注入 (如 SQLiteTaskQueue), 失败重试由队列的 mark_failed 决定
     """
     
-    def __init__(self):
-        self.queue = TaskQueue()
+    # 工作线程等待任务的超时 (秒), 用于定期检查停止信号
+    POLL_TIMEOUT_S = 1.0
+    
+    def __init__(self, queue=None):
+        config = load_scheduler_config()
+        self.queue = queue if queue is not None else create_task_queue(config)
+        self.workers = config.get("workers", 4)
         self.master_agent = None
         self.persister = None
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
     
     def set_agent(self, agent):
         """设置MasterAgent"""
@@ -66,14 +158,15 @@ class Scheduler:
         """设置存储"""
         self.persister = persister
     
-    def submit_task(self, stock: str, quarter: str = "Q4 2025", raw_text: str = "") -> str:
-        """提交任务"""
+    def submit_task(self, stock: str, quarter: str = "Q4 2025", raw_text: str = "",
+                    priority: int = 0) -> str:
+        """提交任务 (priority 越大越先执行)"""
         task = {
             "stock": stock,
             "quarter": quarter,
             "raw_text": raw_text
         }
-        return self.queue.add(task)
+        return self.queue.add(task, priority)
     
     def process_task(self, task: Dict) -> Dict:
         """处理任务"""
@@ -89,14 +182,47 @@ class Scheduler:
                 self.persister.save(task["stock"], task["quarter"], result)
             
             return {"status": "success", "result": result}
-            
+        
         except Exception as e:
             return {"status": "failed", "error": str(e)}
     
+    def run_once(self, timeout: Optional[float] = None) -> bool:
+        """取一个任务并处理; 没有任务 (超时) 时返回 False"""
+        task = self.queue.get(timeout)
+        if not task:
+            return False
+        
+        result = self.process_task(task)
+        # 持久队列只接受仍持有租约的写回; 租约过期被重新认领的任务以新 worker 的结果为准
+        lease_token = task.get("lease_token")
+        if result["status"] == "success":
+            accepted = self.queue.mark_done(task["task_id"], result, lease_token=lease_token)
+        else:
+            accepted = self.queue.mark_failed(task["task_id"], result.get("error", ""), lease_token=lease_token)
+        if accepted is False:
+            print(f"[Scheduler] Lease lost for task {task['task_id']}, result discarded")
+        return True
+    
     def run_loop(self):
-        """运行循环"""
-        while True:
-            task = self.queue.get()
-            if task:
-                result = self.process_task(task)
-                self.queue.mark_done(task["task_id"], result)
+        """运行循环 (阻塞当前线程, 直到 stop)"""
+        while not self._stopping.is_set():
+            self.run_once(timeout=self.POLL_TIMEOUT_S)
+    
+    def start(self, workers: int = None):
+        """启动工作线程"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(workers or self.workers):
+            thread = threading.Thread(target=self.run_loop, name=f"scheduler-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, wait: bool = True):
+        """停止工作线程 (正在处理的任务会执行完)"""
+        self._stopping.set()
+        self.queue.wakeup()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
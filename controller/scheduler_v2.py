@@ -1,13 +1,52 @@
 """
 Controller Scheduler v2
 - 抓取所有市值>10亿财报
-- 触发分析
+- 触发分析: 全量列表分片到进程池, 每个进程独立的 MasterAgent
+- 结果在主进程统一写入存储
+- 开始时报告盘前预热 (controller.premarket) 的缓存覆盖率
 """
 import time
 import json
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 from datetime import datetime, timedelta
+from typing import Dict, List
+
+from config import load_agent_config
 from earnings_calendar import get_all_upcoming_earnings
-from main import master_agent
+from controller.batch import run_batch
+from controller.persistence import ResultStorage
+from controller.premarket import coverage, load_premarket_config, print_coverage, DEFAULT_DATASETS
+
+
+def load_controller_config() -> Dict:
+    return load_agent_config().get("agents", {}).get("controller", {}) or {}
+
+
+# ========== 工作进程 ==========
+
+_worker_agent = None
+
+
+def _init_worker():
+    """进程池 initializer: 每个进程创建自己的 MasterAgent (LLM 后端、缓存均为进程内)"""
+    global _worker_agent
+    from agents.master_agent import MasterAgent
+    _worker_agent = MasterAgent()
+
+
+def _analyze_shard(items: List[Dict], max_concurrency: int) -> Dict:
+    """分析一个分片: 先预取本分片 ticker 的行情数据, 再有界并发分析"""
+    if _worker_agent is None:
+        _init_worker()
+    return asyncio.run(run_batch(_worker_agent, items, max_concurrency=max_concurrency, prefetch=True))
+
+
+def _shard(items: List, count: int) -> List[List]:
+    """轮询分片, 各分片数量相差不超过 1"""
+    return [items[i::count] for i in range(count) if items[i::count]]
 
 
 class Controller:
@@ -15,12 +54,17 @@ class Controller:
     Controller - 扫描所有符合条件的财报
     """
     
-    def __init__(self):
+    def __init__(self, workers: int = None, concurrency: int = None):
+        config = load_controller_config()
         self.min_market_cap = 10e9  # 10B
         self.results_file = "./storage/controller_results.json"
+        self.workers = workers or config.get("workers", 4)
+        self.concurrency = concurrency or config.get("concurrency_per_worker", 4)
+        self.storage = ResultStorage("./storage")
     
     def run_daily(self):
         """每日运行"""
+        start = time.time()
         print(f"\n{'='*60}")
         print(f"Controller - Daily Run {datetime.now().strftime('%Y-%m-%d %H:%M')}")
         print(f"Filter: Market Cap > $10B")
@@ -42,45 +86,86 @@ class Controller:
             cap = e.get('market_cap', 0) / 1e9
             print(f"  - {e.get('stock')}: {e.get('date')}, ${cap:.0f}B")
         
-        # 4. 触发分析 (可选，只分析前10个)
-        print(f"\n[4] Triggering analysis (top 10)...")
+        # 盘前预热覆盖率 (未预热的 ticker 由各分片批量预取)
+        datasets = load_premarket_config().get("datasets", DEFAULT_DATASETS)
+        print_coverage("\n[3.5] Warm cache coverage", coverage([e.get('stock') for e in valid_earnings], datasets))
         
+        # 4. 全量分析: 分片到进程池 (每个分片先批量预取自己的行情数据)
+        earnings_by_stock = {e.get('stock'): e for e in valid_earnings}
+        items = [
+            {
+                "stock": e.get('stock'),
+                "quarter": "Q4 2025",
+                "actual_data": {
+                    "revenue": (e.get('expected_revenue') or 50) * 1e9,
+                    "eps": e.get('expected_eps') or 1.0
+                }
+            }
+            for e in valid_earnings
+        ]
+        print(f"\n[4] Analyzing {len(items)} stocks "
+              f"({self.workers} processes x {self.concurrency} concurrent)...")
+        
+        # 5. 主进程统一写入存储
         results = []
-        for e in valid_earnings[:10]:
-            stock = e.get('stock')
+        for entry in self._run_shards(items):
+            stock = entry["stock"]
+            if entry["status"] != "success":
+                print(f"  ❌ {stock}: {entry.get('error')}")
+                continue
             
-            try:
-                result = master_agent.analyze(
-                    stock=stock,
-                    quarter="Q4 2025",
-                    actual_data={
-                        "revenue": (e.get('expected_revenue') or 50) * 1e9,
-                        "eps": e.get('expected_eps') or 1.0
-                    }
-                )
-                
-                rec = result.get('result', {}).get('structured_data', {}).get('recommendation', 'N/A')
-                print(f"  ✓ {stock}: {rec}")
-                
-                results.append({
-                    "stock": stock,
-                    "date": e.get('date'),
-                    "market_cap": e.get('market_cap'),
-                    "result": result
-                })
-                
-            except Exception as ex:
-                print(f"  ❌ {stock}: {ex}")
+            result = entry["result"]
+            self.storage.save(stock, entry["quarter"], result)
+            rec = result.get('result', {}).get('structured_data', {}).get('recommendation', 'N/A')
+            print(f"  ✓ {stock}: {rec} ({entry['elapsed_ms']}ms)")
+            
+            e = earnings_by_stock.get(stock, {})
+            results.append({
+                "stock": stock,
+                "date": e.get('date'),
+                "market_cap": e.get('market_cap'),
+                "timestamp": datetime.now().isoformat(),
+                "result": result
+            })
         
-        # 5. 保存
+        # 6. 保存
         self._save_results(results)
         
         print(f"\n{'='*60}")
-        print(f"Complete! Analyzed {len(results)} stocks")
+        print(f"Complete! Analyzed {len(results)}/{len(items)} stocks in {int(time.time() - start)}s")
         print(f"{'='*60}")
         
         return results
     
+    def _run_shards(self, items: List[Dict]):
+        """逐个产出分析结果 (按分片完成顺序); workers <= 1 时在当前进程执行"""
+        if not items:
+            return
+        
+        if self.workers <= 1:
+            yield from _analyze_shard(items, self.concurrency)["items"]
+            return
+        
+        shards = _shard(items, self.workers)
+        # spawn: 子进程不继承父进程的线程、连接池与 SQLite 连接
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=get_context("spawn"),
+                                 initializer=_init_worker) as pool:
+            futures = {pool.submit(_analyze_shard, shard, self.concurrency): shard for shard in shards}
+            for future in as_completed(futures):
+                try:
+                    report = future.result()
+                except Exception as ex:
+                    # 整个分片失败 (如进程崩溃), 逐项记为失败
+                    for item in futures[future]:
+                        yield {"stock": item["stock"], "quarter": item["quarter"], "status": "error",
+                               "error": str(ex)}
+                    continue
+                
+                prefetch = report.get("prefetch") or {}
+                print(f"  [shard] {report['succeeded']}/{report['total']} ok in {report['elapsed_ms']}ms"
+                      f" (prefetch {prefetch.get('elapsed_ms', '-')}ms)")
+                yield from report["items"]
+    
     def _save_results(self, results: list):
         import os
         os.makedirs("./storage", exist_ok=True)
@@ -101,5 +186,10 @@ class Controller:
 
 
 if __name__ == "__main__":
-    controller = Controller()
+    parser = argparse.ArgumentParser(description="Daily earnings controller run")
+    parser.add_argument("--workers", type=int, default=None, help="进程数 (默认 agents.controller.workers)")
+    parser.add_argument("--concurrency", type=int, default=None, help="每个进程内的并发分析数")
+    args = parser.parse_args()
+    
+    controller = Controller(workers=args.workers, concurrency=args.concurrency)
     controller.run_daily()
@@ -0,0 +1,77 @@
+"""
+Deadline - 截止时间/超时预算 (线程、asyncio 通用, 不依赖 signal)
+"""
+import time
+from typing import Dict, Any, Optional
+
+from config import load_agent_config
+
+
+DEFAULT_TIMEOUT_S = 20.0
+DEFAULT_BUDGET_MS = 20000  # PRD: 延迟 < 20 秒
+FINAL_STAGE = "synthesis"
+
+
+class Deadline:
+    """
+    绝对截止时间 (time.monotonic)
+    可在线程与协程之间传递, 各层用 remaining() 作为本次 I/O 的超时
+    """
+    
+    def __init__(self, timeout_s: float = None, expires_at: float = None):
+        if expires_at is None:
+            expires_at = time.monotonic() + (timeout_s if timeout_s is not None else DEFAULT_TIMEOUT_S)
+        self.expires_at = expires_at
+    
+    def remaining(self) -> float:
+        """剩余秒数 (>= 0)"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+    
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+    
+    def child(self, timeout_s: float) -> "Deadline":
+        """子截止时间 - 不超过父级"""
+        return Deadline(expires_at=min(self.expires_at, time.monotonic() + timeout_s))
+    
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.2f}s)"
+
+
+def subagent_timeouts(config: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """agent_config.yaml 中各 SubAgent 的 timeout_ms (秒)"""
+    config = config if config is not None else load_agent_config()
+    subagents = config.get("agents", {}).get("subagents", {}) or {}
+    return {
+        name: sub.get("timeout_ms", DEFAULT_TIMEOUT_S * 1000) / 1000
+        for name, sub in subagents.items()
+    }
+
+
+def subagent_timeout(name: str, default: float = DEFAULT_TIMEOUT_S) -> float:
+    """单个 SubAgent 的超时 (秒)"""
+    return subagent_timeouts().get(name, default)
+
+
+class AnalysisBudget:
+    """
+    单次分析的总预算, 拆分为各 SubAgent 的截止时间:
+    - 每个 SubAgent 最多 timeout_ms
+    - 非最终阶段不得占用为 synthesis 预留的时间, 保证最终合成总能执行
+    """
+    
+    def __init__(self, budget_ms: int = None, config: Optional[Dict[str, Any]] = None):
+        config = config if config is not None else load_agent_config()
+        if budget_ms is None:
+            budget_ms = config.get("agents", {}).get("budget_ms", DEFAULT_BUDGET_MS)
+        self.budget_ms = budget_ms
+        self.total = Deadline(budget_ms / 1000)
+        self.timeouts = subagent_timeouts(config)
+        self.reserve_s = self.timeouts.get(FINAL_STAGE, 0.0)
+    
+    def for_agent(self, name: str) -> Deadline:
+        timeout = self.timeouts.get(name, DEFAULT_TIMEOUT_S)
+        expires_at = min(self.total.expires_at, time.monotonic() + timeout)
+        if name != FINAL_STAGE:
+            expires_at = min(expires_at, self.total.expires_at - self.reserve_s)
+        return Deadline(expires_at=expires_at)
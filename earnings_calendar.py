@@ -43,3 +43,8 @@ def get_upcoming_earnings(days: int = 14) -> List[Dict]:
         if 0 <= days_ahead <= days:
             result.append(e)
     return sorted(result, key=lambda x: x['date'])
+
+
+def get_all_upcoming_earnings(days: int = 90) -> List[Dict]:
+    """Controller 使用: 未来 days 天内的全部财报 (不限数量)"""
+    return get_upcoming_earnings(days)
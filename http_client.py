@@ -0,0 +1,177 @@
+"""
+HTTP Client - 共享 HTTP 客户端 (tools.py 使用)
+- keep-alive 连接池 (requests.Session)
+- 令牌桶限流 (SEC EDGAR 约 10 req/s)
+- 429/5xx/连接错误按指数退避 + 抖动重试
+- 同步 get / 异步 get_async
+"""
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import load_config
+
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """令牌桶 - 进程内所有线程、事件循环共享"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _take(self) -> float:
+        """取一个令牌; 返回需要等待的秒数 (0 表示已取到)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+    
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class HTTPClient:
+    """带连接池、限流、重试的 HTTP 客户端"""
+    
+    def __init__(self, base_url: str = "", rate_per_s: float = 10.0, burst: Optional[float] = None,
+                 timeout_s: float = 10.0, max_retries: int = 3, backoff_s: float = 0.5,
+                 max_backoff_s: float = 8.0, pool_size: int = 10,
+                 headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout_s
+        self.max_retries = max_retries
+        self.backoff = backoff_s
+        self.max_backoff = max_backoff_s
+        self.limiter = TokenBucket(rate_per_s, burst)
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(headers or {})
+        
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "errors": 0}
+    
+    def _url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+    
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+    
+    def _delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """指数退避 + full jitter; 429 时优先遵守 Retry-After"""
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+    
+    def _send(self, url: str, params: Optional[Dict], timeout: float) -> requests.Response:
+        self._count("requests")
+        return self.session.get(url, params=params, timeout=timeout)
+    
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None) -> requests.Response:
+        """同步 GET - 重试耗尽后抛出最后的异常, 或返回最后一次的响应"""
+        url = self._url(path)
+        timeout = timeout or self.timeout
+        
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                resp = self._send(url, params, timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._count("errors")
+                    raise
+                self._count("retries")
+                time.sleep(self._delay(attempt))
+                continue
+            
+            if resp.status_code in RETRY_STATUS and attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(self._delay(attempt, resp))
+                continue
+            return resp
+    
+    async def get_async(self, path: str, params: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None) -> requests.Response:
+        """异步 GET - 限流与退避等待不阻塞事件循环, 请求本身在线程池执行"""
+        url = self._url(path)
+        timeout = timeout or self.timeout
+        
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire_async()
+            try:
+                resp = await asyncio.to_thread(self._send, url, params, timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._count("errors")
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            
+            if resp.status_code in RETRY_STATUS and attempt < self.max_retries:
+                self._count("retries")
+                await asyncio.sleep(self._delay(attempt, resp))
+                continue
+            return resp
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "rate_per_s": self.limiter.rate,
+            **self.stats
+        }
+    
+    def close(self):
+        self.session.close()
+
+
+def create_sec_client(config: Optional[Dict[str, Any]] = None) -> HTTPClient:
+    """SEC EDGAR 客户端 (data_config.yaml -> sec)"""
+    config = config if config is not None else load_config("data_config")
+    sec = config.get("sec", {}) or {}
+    return HTTPClient(
+        base_url=sec.get("base_url", "https://efts.sec.gov"),
+        rate_per_s=sec.get("rate_per_s", 8),
+        timeout_s=sec.get("timeout_s", 10),
+        max_retries=sec.get("max_retries", 3),
+        backoff_s=sec.get("backoff_s", 0.5),
+        pool_size=sec.get("pool_size", 10),
+        # SEC 要求 User-Agent 带联系方式, 否则会被限流/拒绝
+        headers={"User-Agent": sec.get("user_agent", "SmarsFA-Ultra admin@example.com")}
+    )
+
+
+# 全局 SEC 客户端
+sec_client = create_sec_client()
@@ -0,0 +1,95 @@
+"""
+LLM - 可插拔后端 (configs/llm_config.yaml)
+"""
+import threading
+from typing import Dict, Any, Optional
+
+from config import load_llm_config
+from .base import LLMBackend, LLMError, LLMTimeout
+from .opencode import OpenCodeBackend
+from .openai_compat import OpenAIBackend
+from .mock import MockBackend
+from .cache import ResponseCache, make_key
+
+
+BACKENDS = {
+    "opencode": OpenCodeBackend,
+    "openai": OpenAIBackend,
+    "mock": MockBackend,
+}
+
+_default_backend: Optional[LLMBackend] = None
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def create_backend(config: Optional[Dict[str, Any]] = None) -> LLMBackend:
+    """按配置创建后端; mock_mode 为 true 时总是使用 MockBackend"""
+    config = config if config is not None else load_llm_config()
+    llm_config = config.get("llm", {})
+    provider = "mock" if config.get("mock_mode") else llm_config.get("provider", "opencode")
+    
+    if provider not in BACKENDS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    
+    options = {
+        "model": llm_config.get("model", ""),
+        "max_concurrency": llm_config.get("max_concurrency", 4),
+        "timeout_s": llm_config.get("timeout_s", 20),
+    }
+    if provider == "openai":
+        options["temperature"] = llm_config.get("temperature", 0.7)
+        options["max_tokens"] = llm_config.get("max_tokens", 2000)
+    options.update(llm_config.get(provider, {}) or {})
+    
+    return BACKENDS[provider](**options)
+
+
+def get_default_backend() -> LLMBackend:
+    """进程内共享的默认后端 (懒加载)"""
+    global _default_backend
+    if _default_backend is None:
+        with _default_lock:
+            if _default_backend is None:
+                _default_backend = create_backend()
+    return _default_backend
+
+
+def create_response_cache(config: Optional[Dict[str, Any]] = None) -> Optional[ResponseCache]:
+    """按配置创建响应缓存; cache.enabled 为 false 时返回 None"""
+    config = config if config is not None else load_llm_config()
+    cache_config = config.get("cache", {}) or {}
+    if not cache_config.get("enabled", False):
+        return None
+    
+    return ResponseCache(
+        max_entries=cache_config.get("max_entries", 1024),
+        ttl_s=cache_config.get("ttl_s", 86400),
+        path=cache_config.get("path") or None
+    )
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """进程内共享的响应缓存 (懒加载)"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = create_response_cache() or False
+    return _default_cache or None
+
+
+__all__ = [
+    "LLMBackend",
+    "LLMError",
+    "LLMTimeout",
+    "OpenCodeBackend",
+    "OpenAIBackend",
+    "MockBackend",
+    "ResponseCache",
+    "make_key",
+    "create_backend",
+    "get_default_backend",
+    "create_response_cache",
+    "get_response_cache",
+]
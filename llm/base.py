@@ -0,0 +1,171 @@
+"""
+LLM Backend - 后端基类 (并发上限 + 同步/异步接口)
+"""
+import time
+import asyncio
+import threading
+from typing import Dict, Any, Optional
+from abc import ABC, abstractmethod
+
+from tracing import span
+
+
+class LLMError(Exception):
+    """LLM 调用失败"""
+    pass
+
+
+class LLMTimeout(LLMError):
+    """LLM 调用超时"""
+    pass
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMBackend(ABC):
+    """
+    LLM 后端基类
+    - complete / complete_async: 同步与异步调用
+    - max_concurrency: 进程内所有线程、事件循环共享的并发上限
+      (同步调用方阻塞在信号量上; 异步调用方挂起等待释放通知, 不轮询)
+    - 子类实现 _complete (及可选的原生异步 _complete_async)
+    """
+    
+    name = "base"
+    cacheable = True  # 响应是否可进入 ResponseCache
+    
+    def __init__(self, model: str = "", max_concurrency: int = 4,
+                 timeout_s: float = 20.0, **options):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.default_timeout = timeout_s
+        self.options = options
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._waiters = set()  # 等待槽位的 (loop, future)
+        self._waiters_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "errors": 0, "timeouts": 0}
+    
+    def complete(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """同步调用"""
+        timeout = timeout or self.default_timeout
+        start = time.monotonic()
+        
+        with span(self.name, kind="llm", model=self.model, prompt_chars=len(prompt)) as s:
+            if not self._slots.acquire(timeout=timeout):
+                self._count("timeouts")
+                s.set_status("timeout")
+                raise LLMTimeout(f"{self.name}: no free slot within {timeout:.1f}s")
+            try:
+                remaining = max(timeout - (time.monotonic() - start), 0.001)
+                s.set("wait_ms", round((time.monotonic() - start) * 1000, 1))
+                return self._tracked(s, self._complete, prompt, remaining)
+            finally:
+                self._release_slot()
+    
+    async def complete_async(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """异步调用 - 等待空闲槽位时不阻塞事件循环"""
+        timeout = timeout or self.default_timeout
+        start = time.monotonic()
+        
+        async with span(self.name, kind="llm", model=self.model, prompt_chars=len(prompt)) as s:
+            if not await self._acquire_slot_async(timeout):
+                self._count("timeouts")
+                s.set_status("timeout")
+                raise LLMTimeout(f"{self.name}: no free slot within {timeout:.1f}s")
+            try:
+                remaining = max(timeout - (time.monotonic() - start), 0.001)
+                s.set("wait_ms", round((time.monotonic() - start) * 1000, 1))
+                self._count("calls")
+                try:
+                    return await self._complete_async(prompt, remaining)
+                except LLMTimeout:
+                    self._count("timeouts")
+                    s.set_status("timeout")
+                    raise
+                except Exception:
+                    self._count("errors")
+                    raise
+            finally:
+                self._release_slot()
+    
+    async def _acquire_slot_async(self, timeout: float) -> bool:
+        """
+        获取槽位; 没有空闲时挂起, 直到任一调用方释放 (跨线程/事件循环通知) 或超时
+        先登记再重试, 避免登记前刚好释放导致的丢失唤醒
+        """
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while not self._slots.acquire(blocking=False):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            waiter = (loop, loop.create_future())
+            with self._waiters_lock:
+                self._waiters.add(waiter)
+            try:
+                if self._slots.acquire(blocking=False):
+                    return True
+                await asyncio.wait_for(waiter[1], timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._waiters_lock:
+                    self._waiters.discard(waiter)
+        return True
+    
+    def _release_slot(self):
+        """归还槽位并唤醒全部异步等待方 (被唤醒者重新竞争, 已超时/取消的不会占用)"""
+        self._slots.release()
+        with self._waiters_lock:
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+    
+    def _tracked(self, s, fn, prompt: str, timeout: float) -> str:
+        self._count("calls")
+        try:
+            return fn(prompt, timeout)
+        except LLMTimeout:
+            self._count("timeouts")
+            s.set_status("timeout")
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+    
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+    
+    @abstractmethod
+    def _complete(self, prompt: str, timeout: float) -> str:
+        """单次调用, 超时须抛出 LLMTimeout"""
+        raise NotImplementedError
+    
+    async def _complete_async(self, prompt: str, timeout: float) -> str:
+        """默认放到线程池执行; 支持原生异步的后端应覆盖"""
+        return await asyncio.to_thread(self._complete, prompt, timeout)
+    
+    def fingerprint(self) -> Dict[str, Any]:
+        """影响输出的模型配置 (用于响应缓存 key)"""
+        return {"backend": self.name, "model": self.model}
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "stats": dict(self.stats)
+        }
+    
+    def close(self):
+        """释放连接/常驻进程"""
+        pass
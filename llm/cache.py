@@ -0,0 +1,91 @@
+"""
+LLM Response Cache - 内容寻址的响应缓存
+key = sha256(SubAgent 名称, 版本, prompt, 模型配置)
+内存 LRU (TTL) + SQLite 磁盘层
+"""
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+from cache import LRUCache, DiskCache, MISSING, hit_rate
+
+
+def make_key(agent: str, version: str, prompt: str, model_config: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"agent": agent, "version": version, "prompt": prompt, "model": model_config},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LLM 响应缓存 - 先查内存, 再查磁盘 (命中后按磁盘条目的剩余有效期回填内存)"""
+    
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 86400,
+                 path: Optional[str] = None):
+        self.ttl_s = ttl_s
+        self.memory = LRUCache(max_entries=max_entries, ttl_s=ttl_s)
+        self.disk = DiskCache(path, table="llm_responses") if path else None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+    
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+    
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self._count("memory_hits")
+            return value["response"]
+        
+        if self.disk is not None:
+            entry = self.disk.get_entry(key)
+            if entry is not MISSING:
+                value, expires_at = entry
+                self._count("disk_hits")
+                remaining = expires_at - time.time() if expires_at is not None else None
+                if remaining is None or remaining > 0:
+                    self.memory.set(key, value, ttl_s=remaining, tag=value.get("agent", ""))
+                return value["response"]
+        
+        self._count("misses")
+        return None
+    
+    def put(self, key: str, response: str, agent: str = ""):
+        value = {"agent": agent, "response": response}
+        self.memory.set(key, value, tag=agent)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl_s=self.ttl_s, tag=agent)
+        self._count("writes")
+    
+    def invalidate(self, key: Optional[str] = None, agent: Optional[str] = None) -> int:
+        """按 key 或按 SubAgent 失效; 都不传时清空全部"""
+        removed = 0
+        if key is not None:
+            removed += int(self.memory.delete(key))
+            if self.disk is not None:
+                removed += int(self.disk.delete(key))
+        elif agent is not None:
+            removed += self.memory.delete_tag(agent)
+            if self.disk is not None:
+                removed += self.disk.delete_tag(agent)
+        else:
+            removed = len(self.memory) + (len(self.disk) if self.disk is not None else 0)
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+        return removed
+    
+    def describe(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        return {
+            **stats,
+            "hit_rate": hit_rate(hits, stats["misses"]),
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+            "evictions": self.memory.stats["evictions"]
+        }
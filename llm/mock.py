@@ -0,0 +1,47 @@
+"""
+Mock Backend - 本地替身 (测试/压测/离线运行)
+"""
+import time
+import random
+import asyncio
+from typing import Callable, Optional
+
+from .base import LLMBackend, LLMTimeout
+
+
+class MockBackend(LLMBackend):
+    """
+    不访问网络的本地后端
+    - latency_s + 0~jitter_s 的模拟延迟, 超过 timeout 时抛出 LLMTimeout
+    - responder(prompt) 生成回复; 未设置时返回空串,
+      由 SubAgent 回退到自身的 mock_response
+    """
+    
+    name = "mock"
+    cacheable = False
+    
+    def __init__(self, latency_s: float = 0.0, jitter_s: float = 0.0,
+                 responder: Optional[Callable[[str], str]] = None, **kwargs):
+        kwargs.setdefault("model", "mock")
+        kwargs.setdefault("max_concurrency", 64)
+        super().__init__(**kwargs)
+        self.latency = latency_s
+        self.jitter = jitter_s
+        self.responder = responder
+    
+    def _delay(self) -> float:
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+    
+    def _complete(self, prompt: str, timeout: float) -> str:
+        delay = self._delay()
+        time.sleep(min(delay, timeout))
+        if delay > timeout:
+            raise LLMTimeout(f"mock latency {delay:.2f}s > timeout {timeout:.2f}s")
+        return self.responder(prompt) if self.responder else ""
+    
+    async def _complete_async(self, prompt: str, timeout: float) -> str:
+        delay = self._delay()
+        await asyncio.sleep(min(delay, timeout))
+        if delay > timeout:
+            raise LLMTimeout(f"mock latency {delay:.2f}s > timeout {timeout:.2f}s")
+        return self.responder(prompt) if self.responder else ""
@@ -0,0 +1,75 @@
+"""
+OpenAI 兼容 HTTP 后端 - keep-alive 连接池
+适用于 OpenAI 以及提供 /chat/completions 兼容接口的服务 (MiniMax 等)
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .base import LLMBackend, LLMError, LLMTimeout
+
+
+class OpenAIBackend(LLMBackend):
+    """/chat/completions 后端, 所有调用共享一个 Session (复用 TCP/TLS 连接)"""
+    
+    name = "openai"
+    
+    def __init__(self, base_url: str = "https://api.openai.com/v1",
+                 api_key_env: str = "OPENAI_API_KEY", temperature: float = 0.7,
+                 max_tokens: int = 2000, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = os.environ.get(api_key_env, "")
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._session = None
+        self._session_lock = threading.Lock()
+    
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers["Authorization"] = f"Bearer {self.api_key}"
+                    self._session = session
+        return self._session
+    
+    def _complete(self, prompt: str, timeout: float) -> str:
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+        try:
+            resp = self.session.post(f"{self.base_url}/chat/completions", json=payload, timeout=timeout)
+        except requests.Timeout:
+            raise LLMTimeout(f"{self.base_url} timeout after {timeout:.1f}s")
+        except requests.RequestException as e:
+            raise LLMError(str(e))
+        
+        if resp.status_code != 200:
+            raise LLMError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        try:
+            return resp.json()["choices"][0]["message"]["content"] or ""
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Unexpected response: {e}")
+    
+    def fingerprint(self):
+        return {
+            **super().fingerprint(),
+            "base_url": self.base_url,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+    
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
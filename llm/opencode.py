@@ -0,0 +1,147 @@
+"""
+OpenCode Backend - 常驻 `opencode serve` + `opencode run --attach`
+
+每次 `opencode run` 冷启动都要重新初始化 provider/MCP。
+这里启动一个常驻的 serve 进程, 之后的调用通过 --attach 复用它,
+serve 启动失败时退回普通的 `opencode run`。
+
+限制: --attach 只省去 provider/MCP 初始化, 每次调用仍会启动一个 `opencode run`
+客户端进程 (进程创建与 CLI 启动开销仍在)。需要去掉逐次进程开销时请改用
+openai 兼容后端 (llm/openai_compat.py, keep-alive 连接池)。
+"""
+import re
+import atexit
+import socket
+import asyncio
+import threading
+import subprocess
+import time
+from typing import List, Optional
+
+from .base import LLMBackend, LLMError, LLMTimeout
+
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class OpenCodeBackend(LLMBackend):
+    """opencode CLI 后端 (每次调用一个 `opencode run` 进程, 见模块说明)"""
+    
+    name = "opencode"
+    
+    def __init__(self, binary: str = "/home/mars/.opencode/bin/opencode",
+                 attach: bool = True, hostname: str = "127.0.0.1", port: int = 4096,
+                 startup_timeout_s: float = 15.0, **kwargs):
+        super().__init__(**kwargs)
+        self.binary = binary
+        self.attach = attach
+        self.hostname = hostname
+        self.port = port
+        self.startup_timeout = startup_timeout_s
+        self._server: Optional[subprocess.Popen] = None
+        self._server_lock = threading.Lock()
+        self._server_failed = False
+    
+    @property
+    def server_url(self) -> str:
+        return f"http://{self.hostname}:{self.port}"
+    
+    def _port_open(self) -> bool:
+        try:
+            with socket.create_connection((self.hostname, self.port), timeout=0.2):
+                return True
+        except OSError:
+            return False
+    
+    def _ensure_server(self) -> bool:
+        """启动 (或复用已有的) 常驻 serve 进程, 返回是否可 attach"""
+        if not self.attach or self._server_failed:
+            return False
+        if self._server and self._server.poll() is None:
+            return True
+        
+        with self._server_lock:
+            if self._server and self._server.poll() is None:
+                return True
+            if self._port_open():
+                # 其它进程已启动 serve, 直接复用
+                return True
+            
+            try:
+                self._server = subprocess.Popen(
+                    [self.binary, "serve", "--hostname", self.hostname, "--port", str(self.port)],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                atexit.register(self.close)
+            except OSError:
+                self._server_failed = True
+                return False
+            
+            deadline = time.monotonic() + self.startup_timeout
+            while time.monotonic() < deadline:
+                if self._server.poll() is not None:
+                    break
+                if self._port_open():
+                    return True
+                time.sleep(0.1)
+            
+            self._server_failed = True
+            self.close()
+            return False
+    
+    def _command(self, prompt: str) -> List[str]:
+        cmd = [self.binary, "run"]
+        if self._ensure_server():
+            cmd += ["--attach", self.server_url]
+        if self.model:
+            cmd += ["--model", self.model]
+        cmd.append(prompt)
+        return cmd
+    
+    def _complete(self, prompt: str, timeout: float) -> str:
+        try:
+            result = subprocess.run(
+                self._command(prompt), capture_output=True, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            raise LLMTimeout(f"opencode run timeout after {timeout:.1f}s")
+        except OSError as e:
+            raise LLMError(f"opencode unavailable: {e}")
+        
+        if result.returncode != 0:
+            raise LLMError(f"opencode exit {result.returncode}: {result.stderr.strip()[:200]}")
+        return ANSI_ESCAPE.sub('', result.stdout).strip()
+    
+    async def _complete_async(self, prompt: str, timeout: float) -> str:
+        cmd = await asyncio.to_thread(self._command, prompt)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            raise LLMError(f"opencode unavailable: {e}")
+        
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeout(f"opencode run timeout after {timeout:.1f}s")
+        finally:
+            # 超时或被取消时不留后台进程
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        
+        if proc.returncode != 0:
+            raise LLMError(f"opencode exit {proc.returncode}: {stderr.decode(errors='replace').strip()[:200]}")
+        return ANSI_ESCAPE.sub('', stdout.decode("utf-8", errors="replace")).strip()
+    
+    def close(self):
+        server, self._server = self._server, None
+        if server and server.poll() is None:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
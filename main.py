@@ -4,19 +4,29 @@ SmarsFA-Ultra - Main API Server
 """
 import os
 import sys
+import json
+import time
+import asyncio
 
 # 添加当前目录到path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
 import uvicorn
 
 # 导入模块
 from agents.master_agent import MasterAgent
-from controller import Scheduler, ResultStorage
+from controller import Scheduler, ResultStorage, run_batch
+from controller.batch import load_batch_config
+from llm import get_default_backend, get_response_cache
+from market_cache import market_cache
+from http_client import sec_client
+from metrics import REGISTRY
+from tracing import TRACE_HEADER, trace_context, get_trace
 
 app = FastAPI(title="SmarsFA-Ultra", version="1.0.0")
 
@@ -34,6 +44,75 @@ scheduler = Scheduler()
 scheduler.set_agent(master_agent)
 scheduler.set_persister(ResultStorage("./storage"))
 
+HTTP_SECONDS = REGISTRY.histogram(
+    "smarsfa_http_request_duration_seconds", "HTTP request latency", labels=("method", "route")
+)
+HTTP_TOTAL = REGISTRY.counter(
+    "smarsfa_http_requests_total", "HTTP requests by status code", labels=("method", "route", "status")
+)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """每个请求一个 trace_id (沿用请求头 X-Trace-Id), 并记录请求耗时"""
+    start = time.perf_counter()
+    with trace_context(request.headers.get(TRACE_HEADER)) as trace_id:
+        response = await call_next(request)
+    # 按路由模板聚合, 避免 /api/traces/{id} 之类的路径撑爆 label
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, route=path)
+    HTTP_TOTAL.inc(method=request.method, route=path, status=response.status_code)
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
+
+def _cache_samples():
+    """以下 collector 在 /metrics 导出时才读取各组件的 describe()/stats"""
+    samples = []
+    llm_cache = get_response_cache()
+    caches = {"market_data": market_cache.describe()}
+    if llm_cache:
+        caches["llm"] = llm_cache.describe()
+    if master_agent.results:
+        caches["subagent_results"] = master_agent.results.describe()
+    for name, stats in caches.items():
+        samples.append(("smarsfa_cache_hit_rate", {"cache": name}, stats["hit_rate"]))
+    return samples
+
+
+def _cache_event_samples():
+    samples = []
+    llm_cache = get_response_cache()
+    if llm_cache:
+        for key, value in llm_cache.describe().items():
+            if key in ("memory_hits", "disk_hits", "misses"):
+                samples.append(("smarsfa_cache_events_total", {"cache": "llm", "event": key}, value))
+    market = market_cache.describe()
+    for key in ("hits", "disk_hits", "deduplicated", "misses", "fetch_errors"):
+        samples.append(("smarsfa_cache_events_total", {"cache": "market_data", "event": key}, market[key]))
+    return samples
+
+
+def _upstream_samples():
+    backend = master_agent.llm or get_default_backend()
+    samples = [
+        ("smarsfa_upstream_events_total", {"upstream": f"llm:{backend.name}", "event": key}, value)
+        for key, value in backend.describe()["stats"].items()
+    ]
+    samples.extend(
+        ("smarsfa_upstream_events_total", {"upstream": "sec_http", "event": key}, value)
+        for key, value in sec_client.stats.items()
+    )
+    return samples
+
+
+REGISTRY.register_collector("smarsfa_cache_hit_rate", "gauge", "Cache hit rate", _cache_samples)
+REGISTRY.register_collector("smarsfa_cache_events_total", "counter", "Cache hits/misses",
+                            _cache_event_samples)
+REGISTRY.register_collector("smarsfa_upstream_events_total", "counter",
+                            "LLM backend and SEC HTTP calls, errors, timeouts and retries", _upstream_samples)
+
 
 class AnalyzeRequest(BaseModel):
     stock: str
@@ -42,6 +121,28 @@ class AnalyzeRequest(BaseModel):
     actual_revenue: Optional[float] = None  # 实际营收(手动输入)
     actual_eps: Optional[float] = None      # 实际EPS(手动输入)
     actual_net_income: Optional[float] = None  # 实际净利润
+    
+    def actual_data(self) -> Optional[Dict]:
+        """手动输入的实际数据 (单位: 十亿)"""
+        if not (self.actual_revenue or self.actual_eps):
+            return None
+        return {
+            "revenue": self.actual_revenue * 1e9 if self.actual_revenue else 0,
+            "eps": self.actual_eps,
+            "net_income": self.actual_net_income * 1e9 if self.actual_net_income else 0,
+        }
+
+
+class BatchAnalyzeRequest(BaseModel):
+    items: List[AnalyzeRequest]
+    max_concurrency: Optional[int] = Field(None, ge=1, le=64)  # 默认 agents.batch.max_concurrency
+    token_budget: Optional[int] = Field(None, ge=0)  # 默认 agents.tokens.batch_budget, 0 为不限
+    save: bool = True
+
+
+def _sse(event: str, data: Dict) -> str:
+    """Server-Sent Events 帧"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
 
 @app.get("/")
@@ -58,7 +159,7 @@ def health():
         "status": "ok",
         "version": "1.0.0",
         "architecture": "SubAgent",
-        "execution_order": MasterAgent.EXECUTION_ORDER
+        "execution_order": master_agent.execution_order
     }
 
 
@@ -66,24 +167,17 @@ def health():
 async def analyze(request: AnalyzeRequest):
     """分析股票"""
     try:
-        # 构建实际数据
-        actual_data = None
-        if request.actual_revenue or request.actual_eps:
-            actual_data = {
-                "revenue": request.actual_revenue * 1e9 if request.actual_revenue else 0,
-                "eps": request.actual_eps,
-                "net_income": request.actual_net_income * 1e9 if request.actual_net_income else 0,
-            }
-        
-        result = master_agent.analyze(
+        result = await master_agent.analyze_async(
             request.stock.upper(),
             request.quarter,
             request.raw_text,
-            actual_data
+            request.actual_data()
         )
         
-        # 存储
-        scheduler.persister.save(request.stock.upper(), request.quarter, result)
+        # 存储 (文件 I/O 放到线程池)
+        await asyncio.to_thread(
+            scheduler.persister.save, request.stock.upper(), request.quarter, result
+        )
         
         return {
             "status": "success",
@@ -94,26 +188,154 @@ async def analyze(request: AnalyzeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/analyze/stream")
+async def analyze_stream(request: AnalyzeRequest):
+    """
+    流式分析 (SSE) - 每个 SubAgent 完成即推送
+    事件: start / subagent / final / error
+    """
+    stock = request.stock.upper()
+    
+    async def events():
+        try:
+            async for event in master_agent.analyze_stream(
+                stock, request.quarter, request.raw_text, request.actual_data()
+            ):
+                if event["event"] == "final":
+                    await asyncio.to_thread(scheduler.persister.save, stock, request.quarter, event["data"])
+                yield _sse(event["event"], event["data"])
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(request: BatchAnalyzeRequest):
+    """批量分析 - 有界并发, 返回逐项状态与耗时"""
+    max_items = load_batch_config().get("max_items", 500)
+    if len(request.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"too many items (max {max_items})")
+    
+    items = [
+        {
+            "stock": item.stock.upper(),
+            "quarter": item.quarter,
+            "raw_text": item.raw_text,
+            "actual_data": item.actual_data()
+        }
+        for item in request.items
+    ]
+    
+    def save(item: Dict, result: Dict):
+        scheduler.persister.save(item["stock"], item["quarter"], result)
+    
+    return await run_batch(
+        master_agent, items,
+        max_concurrency=request.max_concurrency,
+        on_result=save if request.save else None,
+        token_budget=request.token_budget
+    )
+
+
 @app.get("/api/history")
-def get_history(stock: Optional[str] = None):
-    """获取历史"""
-    results = scheduler.persister.get_all(stock)
-    return {"count": len(results), "results": results}
+def get_history(
+    stock: Optional[str] = None,
+    quarter: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    recommendation: Optional[str] = None,
+    fields: Literal["summary", "full"] = "summary",
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    获取历史 (游标分页, 最新在前)
+    fields=summary 只返回摘要 (不含 memory); 下一页传入返回的 next_cursor
+    """
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return scheduler.persister.page(
+        stock=stock.upper() if stock else None,
+        quarter=quarter,
+        since=since,
+        until=until,
+        recommendation=recommendation,
+        fields=fields,
+        cursor=cursor,
+        limit=limit
+    )
 
 
 @app.get("/api/agents/status")
 def agents_status():
     """Agent状态"""
     return {
-        "execution_order": MasterAgent.EXECUTION_ORDER,
-        "subagents": list(master_agent.subagents.keys())
+        "execution_order": master_agent.execution_order,
+        "subagents": list(master_agent.subagents.keys()),
+        "graph": master_agent.graph.describe(),
+        "llm": (master_agent.llm or get_default_backend()).describe()
+    }
+
+
+@app.get("/api/cache")
+def cache_stats():
+    """缓存命中统计"""
+    llm_cache = get_response_cache()
+    return {
+        "llm": llm_cache.describe() if llm_cache else {"enabled": False},
+        "market_data": market_cache.describe(),
+        "subagent_results": master_agent.results.describe() if master_agent.results else {"enabled": False},
+        "sec_http": sec_client.describe()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 文本格式: span/HTTP 延迟直方图, 错误/超时计数, 缓存命中率"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/traces/{trace_id}")
+def get_trace_spans(trace_id: str):
+    """某个请求的全部 span (进程内最近的 span 缓冲区)"""
+    spans = get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="trace not found")
+    return {"trace_id": trace_id, "count": len(spans), "spans": spans}
+
+
+@app.delete("/api/cache/llm")
+def invalidate_llm_cache(agent: Optional[str] = None, key: Optional[str] = None):
+    """失效 LLM 响应缓存 (按 SubAgent 名称/key, 不传则清空)"""
+    llm_cache = get_response_cache()
+    if not llm_cache:
+        return {"removed": 0}
+    return {"removed": llm_cache.invalidate(key=key, agent=agent)}
+
+
+@app.delete("/api/cache/market")
+def invalidate_market_cache(dataset: Optional[str] = None, ticker: Optional[str] = None):
+    """失效行情缓存 (fundamentals/filings/options/quote, 可指定 ticker)"""
+    return {"removed": market_cache.invalidate(dataset=dataset, ticker=ticker)}
+
+
+@app.delete("/api/cache/results")
+def invalidate_subagent_results(stock: Optional[str] = None):
+    """失效已保存的 SubAgent 结果 (增量重分析), 下次分析该 ticker 全量执行"""
+    if not master_agent.results:
+        return {"removed": 0}
+    return {"removed": master_agent.results.invalidate(stock=stock)}
+
+
 if __name__ == "__main__":
     print("=" * 60)
     print("SmarsFA-Ultra - Engineering Version")
     print("Architecture: SubAgent Cognitive")
-    print("Execution Order:", MasterAgent.EXECUTION_ORDER)
+    print("Execution Order:", master_agent.execution_order)
     print("=" * 60)
     uvicorn.run(app, host="0.0.0.0", port=9000)
@@ -0,0 +1,242 @@
+"""
+Market Data Cache - 行情数据缓存
+- 按数据集设置 TTL (财报数据小时级, 期权分钟级)
+- single-flight: 同一 (数据集, ticker) 并发请求只触发一次上游拉取
+- LRU 上限, 控制内存
+- 每次取数记录一个 fetch span (cache=hit/follow/lead)
+- 可选 SQLite 磁盘层 (cache.path): 盘前预取进程写入, 之后的运行进程命中后回填内存
+"""
+import copy
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache import LRUCache, DiskCache, MISSING, hit_rate
+from config import load_config
+from tracing import span
+
+
+DEFAULT_TTLS = {
+    "fundamentals": 6 * 3600,
+    "filings": 12 * 3600,
+    "options": 300,
+    "quote": 900,
+}
+
+
+def load_data_config() -> Dict[str, Any]:
+    """数据源配置"""
+    return load_config("data_config")
+
+
+class MarketDataCache:
+    """行情数据缓存 (线程安全, 同步/异步调用方共享同一份数据与 in-flight 请求)"""
+    
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 512,
+                 path: Optional[str] = None):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._memory = LRUCache(max_entries=max_entries)
+        self._disk = DiskCache(path, table="market_data") if path else None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "deduplicated": 0, "fetch_errors": 0}
+    
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> "MarketDataCache":
+        config = config if config is not None else load_data_config()
+        cache_config = config.get("market_data", {}).get("cache", {}) or {}
+        return cls(ttls=cache_config.get("ttl_s"), max_entries=cache_config.get("max_entries", 512),
+                   path=cache_config.get("path"))
+    
+    @staticmethod
+    def key(dataset: str, ticker: str) -> str:
+        return f"{dataset}:{ticker.upper()}"
+    
+    @staticmethod
+    def cacheable(value: Any) -> bool:
+        """上游失败时 tools 返回带 error 的 dict, 不缓存"""
+        return not (isinstance(value, dict) and value.get("error"))
+    
+    def _join(self, key: str):
+        """返回 ("hit", value) / ("follow", future) / ("lead", future)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not MISSING:
+                self.stats["hits"] += 1
+                return "hit", entry["value"]
+        
+        # 磁盘读取不持锁; 并发读到同一条目只是重复回填
+        entry = self._load(key)
+        with self._lock:
+            if entry is not MISSING:
+                self.stats["disk_hits"] += 1
+                return "hit", entry["value"]
+            
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["deduplicated"] += 1
+                return "follow", future
+            
+            self.stats["misses"] += 1
+            future = Future()
+            self._inflight[key] = future
+            return "lead", future
+    
+    def _lead(self, key: str, dataset: str, future: Future, fetch: Callable[[], Any]) -> Any:
+        try:
+            value = fetch()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return self._complete(key, dataset, future, value)
+    
+    async def _lead_async(self, key: str, dataset: str, future: Future,
+                          fetch_async: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch_async()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return self._complete(key, dataset, future, value)
+    
+    def _fail(self, key: str, future: Future, error: BaseException):
+        with self._lock:
+            self.stats["fetch_errors"] += 1
+            self._inflight.pop(key, None)
+        future.set_exception(error)
+    
+    def _complete(self, key: str, dataset: str, future: Future, value: Any) -> Any:
+        if self.cacheable(value):
+            self.put(dataset, key.split(":", 1)[1], value)
+        with self._lock:
+            if not self.cacheable(value):
+                self.stats["fetch_errors"] += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return copy.deepcopy(value)
+    
+    def get_or_fetch(self, dataset: str, ticker: str, fetch: Callable[[], Any]) -> Any:
+        """命中直接返回副本; 未命中时只有一个调用方执行 fetch, 其它调用方等待结果"""
+        key = self.key(dataset, ticker)
+        state, value = self._join(key)
+        with span(dataset, kind="fetch", ticker=ticker.upper(), cache=state):
+            if state == "hit":
+                return copy.deepcopy(value)
+            if state == "follow":
+                return copy.deepcopy(value.result())
+            return self._lead(key, dataset, value, fetch)
+    
+    async def get_or_fetch_async(self, dataset: str, ticker: str, fetch: Callable[[], Any],
+                                 fetch_async: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """
+        异步版: 等待他人的 in-flight 请求时不占线程
+        有原生异步 fetch_async 时直接 await, 否则阻塞的 fetch 放到线程池
+        """
+        key = self.key(dataset, ticker)
+        state, value = self._join(key)
+        async with span(dataset, kind="fetch", ticker=ticker.upper(), cache=state):
+            if state == "hit":
+                return copy.deepcopy(value)
+            if state == "follow":
+                return copy.deepcopy(await asyncio.wrap_future(value))
+            if fetch_async is not None:
+                return await self._lead_async(key, dataset, value, fetch_async)
+            return await asyncio.to_thread(self._lead, key, dataset, value, fetch)
+    
+    def _load(self, key: str):
+        """从磁盘层读取未过期条目并回填内存 (剩余 TTL 不变)"""
+        if self._disk is None:
+            return MISSING
+        entry = self._disk.get(key)
+        if entry is not MISSING:
+            ttl_s = entry["expires_at"] - time.time() if entry.get("expires_at") else None
+            self._memory.set(key, entry, ttl_s=ttl_s, tag=key.split(":", 1)[0])
+        return entry
+    
+    def memory_only(self):
+        """
+        关闭磁盘层, 之后只读写本进程内存 (离线脚本/基准测试用)
+        避免把假数据写进共享的 SQLite 文件, 或清掉盘前预热的条目
+        """
+        with self._lock:
+            self._disk = None
+    
+    def _peek(self, key: str):
+        entry = self._memory.peek(key)
+        return self._load(key) if entry is MISSING else entry
+    
+    def _store(self, key: str, dataset: str, entry: Dict[str, Any]):
+        ttl_s = entry["expires_at"] - time.time() if entry.get("expires_at") else None
+        self._memory.set(key, entry, ttl_s=ttl_s, tag=dataset)
+        if self._disk is not None:
+            self._disk.set(key, entry, ttl_s=ttl_s, tag=dataset)
+    
+    def put(self, dataset: str, ticker: str, value: Any, ttl_s: Optional[float] = None):
+        """写入缓存 (批量预取时直接调用); ttl_s 默认按数据集"""
+        now = time.time()
+        ttl_s = ttl_s if ttl_s is not None else self.ttls.get(dataset)
+        entry = {"value": value, "fetched_at": now, "expires_at": now + ttl_s if ttl_s else None}
+        self._store(self.key(dataset, ticker), dataset, entry)
+    
+    def hold(self, dataset: str, ticker: str, until: float) -> bool:
+        """把已有条目的过期时间延后到 until (epoch 秒), fetched_at 不变; 无缓存时返回 False"""
+        key = self.key(dataset, ticker)
+        entry = self._peek(key)
+        if entry is MISSING:
+            return False
+        if entry.get("expires_at") is not None and entry["expires_at"] < until:
+            self._store(key, dataset, {**entry, "expires_at": until})
+        return True
+    
+    def contains(self, dataset: str, ticker: str) -> bool:
+        """是否有未过期的缓存 (不计入命中统计)"""
+        return self._peek(self.key(dataset, ticker)) is not MISSING
+    
+    def fetched_at(self, dataset: str, ticker: str) -> Optional[float]:
+        """数据快照时间 (epoch 秒), 无缓存时为 None"""
+        entry = self._peek(self.key(dataset, ticker))
+        return None if entry is MISSING else entry["fetched_at"]
+    
+    def invalidate(self, dataset: Optional[str] = None, ticker: Optional[str] = None) -> int:
+        """
+        内存与磁盘层一起失效; 返回删除的条目数 (两层各自计数)
+        只传 ticker 时删除该 ticker 在各数据集的条目; 都不传时清空
+        """
+        if ticker:
+            removed = 0
+            for name in ([dataset] if dataset else list(self.ttls)):
+                key = self.key(name, ticker)
+                removed += int(self._memory.delete(key))
+                if self._disk is not None:
+                    removed += int(self._disk.delete(key))
+            return removed
+        if dataset:
+            removed = self._memory.delete_tag(dataset)
+            if self._disk is not None:
+                removed += self._disk.delete_tag(dataset)
+            return removed
+        removed = len(self._memory) + (len(self._disk) if self._disk is not None else 0)
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+        return removed
+    
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            inflight = len(self._inflight)
+        return {
+            **stats,
+            "hit_rate": hit_rate(stats["hits"] + stats["disk_hits"] + stats["deduplicated"], stats["misses"]),
+            "entries": len(self._memory),
+            "disk": {"path": self._disk.path, "entries": len(self._disk)} if self._disk is not None else None,
+            "inflight": inflight,
+            "evictions": self._memory.stats["evictions"],
+            "ttl_s": self.ttls
+        }
+
+
+# 全局行情缓存
+market_cache = MarketDataCache.from_config()
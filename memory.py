@@ -47,6 +47,15 @@ class WorkingMemory:
         if self.context:
             self.context.whale_activity.update(data)
     
+    def update_namespace(self, namespace: str, data: Dict[str, Any]):
+        """按 namespace 名称更新 (AgentContext 未定义的 namespace 写入 extensions)"""
+        if not self.context:
+            return
+        target = getattr(self.context, namespace, None)
+        if not isinstance(target, dict):
+            target = self.context.extensions.setdefault(namespace, {})
+        target.update(data)
+    
     def add_risk_flag(self, flag: str):
         """添加风险标记"""
         if self.context and flag not in self.context.risk_flags:
@@ -76,5 +85,7 @@ class WorkingMemory:
     def to_dict(self) -> Dict[str, Any]:
         """转为dict"""
         if self.context:
-            return self.context.model_dump()
+            data = self.context.model_dump()
+            data.update(data.pop("extensions"))
+            return data
         return {}
@@ -4,7 +4,7 @@ Message Bus - SubAgent 消息通信总线
 """
 import asyncio
 import json
-from typing import Dict, List, Callable, Any
+from typing import Dict, List, Callable, Any, Optional, Set
 from datetime import datetime
 from dataclasses import dataclass, field, asdict
 from enum import Enum
@@ -35,24 +35,83 @@ class Message:
         return d
 
 
+BROADCAST = "BROADCAST"
+
+
 class MessageBus:
     """
     消息总线 - SubAgent 间通信
-    支持 Pub/Sub 模式
+    - 每个 agent 独立的有界邮箱 (asyncio.Queue), 路由 O(1), 同一收件人内保持发送顺序
+    - subscribe 的回调在消息投递时调用 (同步或 async 函数)
+    - 广播: 同一个 Message 对象放入每个邮箱, 不复制 (接收方不要修改)
+    - 邮箱满时 publish 等待 (背压), publish_nowait 直接返回 False
+    - stop 后 receive 立即返回 None
+    - 邮箱与 stop 事件绑定当前事件循环; 换了循环 (如模块级实例经历多次 asyncio.run) 时重建, 未读消息保留
     """
     
-    def __init__(self):
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
         self._subscribers: Dict[str, List[Callable]] = {}
-        self._queue: asyncio.Queue = asyncio.Queue()
+        self._mailboxes: Dict[str, asyncio.Queue] = {}
         self._running = False
+        self._stopped = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0, "callback_errors": 0}
+    
+    def _bind(self):
+        """
+        在事件循环内调用: 循环变化时重建 stop 事件与邮箱 (asyncio 原语只能在首次等待的循环上使用)
+        旧邮箱中的未读消息按顺序转入新邮箱; 旧循环的回调任务已随循环结束, 不再等待
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if loop is self._loop:
+            return
+        self._loop = loop
+        
+        stopped = asyncio.Event()
+        if self._stopped.is_set():
+            stopped.set()
+        self._stopped = stopped
+        for name, old in list(self._mailboxes.items()):
+            mailbox = self._mailboxes[name] = asyncio.Queue(maxsize=self.maxsize)
+            while not old.empty():
+                mailbox.put_nowait(old.get_nowait())
+        self._tasks = set()
     
     async def start(self):
         """启动消息总线"""
+        self._bind()
         self._running = True
+        self._stopped.clear()
     
     async def stop(self):
-        """停止消息总线"""
+        """停止消息总线: 唤醒所有等待中的 receive, 等待进行中的 async 回调结束"""
+        self._bind()
         self._running = False
+        self._stopped.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    @property
+    def running(self) -> bool:
+        return self._running
+    
+    def register(self, agent_name: str) -> asyncio.Queue:
+        """创建 (或返回已有的) 邮箱"""
+        self._bind()
+        mailbox = self._mailboxes.get(agent_name)
+        if mailbox is None:
+            mailbox = self._mailboxes[agent_name] = asyncio.Queue(maxsize=self.maxsize)
+        return mailbox
+    
+    def unregister(self, agent_name: str):
+        """删除邮箱 (未读消息丢弃) 与订阅"""
+        self._mailboxes.pop(agent_name, None)
+        self._subscribers.pop(agent_name, None)
     
     def subscribe(self, agent_name: str, callback: Callable):
         """订阅消息"""
@@ -65,28 +124,102 @@ class MessageBus:
         if agent_name in self._subscribers:
             self._subscribers[agent_name].remove(callback)
     
-    async def publish(self, message: Message):
-        """发布消息"""
-        await self._queue.put(message)
+    def _recipients(self, message: Message) -> List[str]:
+        if message.to_agent == BROADCAST:
+            return [name for name in set(self._mailboxes) | set(self._subscribers)
+                    if name != message.from_agent]
+        return [message.to_agent]
     
-    async def receive(self, agent_name: str, timeout: float = 30.0) -> Message:
-        """接收消息 (阻塞)"""
-        try:
-            while self._running:
-                msg = await asyncio.wait_for(self._queue.get(), timeout=timeout)
-                
-                # 检查是否是发给自己的
-                if msg.to_agent == agent_name or msg.to_agent == "BROADCAST":
-                    return msg
-                
-                # 不是发给自己的，放回队列
-                await self._queue.put(msg)
-                
-        except asyncio.TimeoutError:
+    def _dispatch(self, agent_name: str, message: Message):
+        """调用订阅回调; async 回调作为后台任务执行"""
+        for callback in self._subscribers.get(agent_name, ()):
+            try:
+                result = callback(message)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.ensure_future(result)
+                    self._tasks.add(task)
+                    task.add_done_callback(self._callback_done)
+            except Exception as e:
+                self.stats["callback_errors"] += 1
+                print(f"[MessageBus] callback error ({agent_name}): {e}")
+    
+    def _callback_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["callback_errors"] += 1
+            print(f"[MessageBus] callback error: {task.exception()}")
+    
+    def _has_mailbox(self, agent_name: str) -> bool:
+        # 只有订阅回调的 agent 不需要邮箱
+        return agent_name in self._mailboxes or agent_name not in self._subscribers
+    
+    async def publish(self, message: Message, timeout: float = None):
+        """
+        发布消息
+        收件人邮箱满时等待 (背压), 超过 timeout 抛出 asyncio.TimeoutError
+        """
+        self.stats["published"] += 1
+        for name in self._recipients(message):
+            if self._has_mailbox(name):
+                mailbox = self.register(name)
+                if timeout is None:
+                    await mailbox.put(message)
+                else:
+                    await asyncio.wait_for(mailbox.put(message), timeout)
+            self._dispatch(name, message)
+            self.stats["delivered"] += 1
+    
+    def publish_nowait(self, message: Message) -> bool:
+        """非阻塞发布; 任一收件人邮箱已满时该收件人的消息被丢弃, 返回 False"""
+        self.stats["published"] += 1
+        delivered_all = True
+        for name in self._recipients(message):
+            if self._has_mailbox(name):
+                try:
+                    self.register(name).put_nowait(message)
+                except asyncio.QueueFull:
+                    self.stats["dropped"] += 1
+                    delivered_all = False
+                    continue
+            self._dispatch(name, message)
+            self.stats["delivered"] += 1
+        return delivered_all
+    
+    async def receive(self, agent_name: str, timeout: float = 30.0) -> Optional[Message]:
+        """接收消息 (阻塞); 超时或总线已停止时返回 None"""
+        if not self._running:
             return None
+        
+        mailbox = self.register(agent_name)
+        if not mailbox.empty():
+            return mailbox.get_nowait()
+        
+        get = asyncio.ensure_future(mailbox.get())
+        stopped = asyncio.ensure_future(self._stopped.wait())
+        try:
+            await asyncio.wait({get, stopped}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopped.cancel()
+            get.cancel()
+        
+        # cancel 前已取到的消息不能丢
+        if get.done() and not get.cancelled() and get.exception() is None:
+            return get.result()
+        return None
+    
+    def get_queue_size(self, agent_name: str = None) -> int:
+        if agent_name is not None:
+            mailbox = self._mailboxes.get(agent_name)
+            return mailbox.qsize() if mailbox else 0
+        return sum(mailbox.qsize() for mailbox in self._mailboxes.values())
     
-    def get_queue_size(self) -> int:
-        return self._queue.qsize()
+    def describe(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self._running,
+            "mailboxes": {name: mailbox.qsize() for name, mailbox in self._mailboxes.items()},
+            "subscribers": {name: len(callbacks) for name, callbacks in self._subscribers.items()}
+        }
 
 
 # 全局消息总线实例
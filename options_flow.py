@@ -0,0 +1,169 @@
+"""
+Options Flow - 期权资金流分析 (向量化)
+- 一次读入全部到期日的期权链, 合并为一张 DataFrame
+- Call/Put 成交量与持仓比, 权利金加权资金流
+- 异常成交: 成交量/持仓比的 z-score
+- 行权价集中度 (成交量占比 + HHI)
+全部基于 NumPy/pandas 列运算, 不逐行循环
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+CHAIN_COLUMNS = ["type", "expiration", "strike", "volume", "open_interest", "price"]
+
+DEFAULT_OPTIONS = {
+    "max_expirations": 12,  # 只看最近 N 个到期日 (远月流动性差, 且每个到期日一次请求)
+    "max_workers": 6,
+    "unusual_z": 3.0,       # 成交量/持仓比 z-score 阈值
+    "min_volume": 100,      # 异常成交最低成交量, 过滤零星成交
+    "flow_threshold": 0.2,  # 净权利金占比超过该值判定方向
+    "top_n": 5,
+}
+
+CONTRACT_MULTIPLIER = 100
+
+
+def _normalize(frame: pd.DataFrame, option_type: str, expiration: str) -> pd.DataFrame:
+    """yfinance 期权链 -> 统一列; 价格优先用 bid/ask 中间价, 缺失时用最新成交价"""
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=CHAIN_COLUMNS)
+    
+    bid = frame.get("bid", pd.Series(np.nan, index=frame.index)).astype(float)
+    ask = frame.get("ask", pd.Series(np.nan, index=frame.index)).astype(float)
+    mid = (bid + ask) / 2
+    last = frame.get("lastPrice", pd.Series(np.nan, index=frame.index)).astype(float)
+    
+    return pd.DataFrame({
+        "type": option_type,
+        "expiration": expiration,
+        "strike": frame["strike"].astype(float),
+        "volume": frame.get("volume", pd.Series(0, index=frame.index)).fillna(0).astype(float),
+        "open_interest": frame.get("openInterest", pd.Series(0, index=frame.index)).fillna(0).astype(float),
+        "price": mid.where(mid > 0, last).fillna(0.0),
+    })
+
+
+def load_option_chain(ticker, max_expirations: int = 12, max_workers: int = 6) -> pd.DataFrame:
+    """
+    拉取全部 (最近 max_expirations 个) 到期日的期权链
+    ticker: yfinance.Ticker; 各到期日并发请求, 最后一次性 concat
+    """
+    expirations = list(ticker.options or [])[:max_expirations]
+    if not expirations:
+        return pd.DataFrame(columns=CHAIN_COLUMNS)
+    
+    def fetch(expiration: str) -> List[pd.DataFrame]:
+        chain = ticker.option_chain(expiration)
+        return [_normalize(chain.calls, "call", expiration), _normalize(chain.puts, "put", expiration)]
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(expirations))) as pool:
+        frames = [f for pair in pool.map(fetch, expirations) for f in pair]
+    
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=CHAIN_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return round(numerator / denominator, 2) if denominator > 0 else 0
+
+
+def _unusual_activity(chain: pd.DataFrame, z_threshold: float, min_volume: float,
+                      top_n: int) -> Dict[str, Any]:
+    """成交量/持仓比 z-score (log 尺度, 抑制极端值); 持仓为 0 时按 1 计"""
+    ratio = chain["volume"].to_numpy() / np.maximum(chain["open_interest"].to_numpy(), 1.0)
+    log_ratio = np.log1p(ratio)
+    std = log_ratio.std()
+    z = (log_ratio - log_ratio.mean()) / std if std > 0 else np.zeros_like(log_ratio)
+    
+    mask = (z >= z_threshold) & (chain["volume"].to_numpy() >= min_volume)
+    flagged = chain.loc[mask].assign(vol_oi_ratio=ratio[mask], z_score=z[mask])
+    top = flagged.nlargest(top_n, "z_score")
+    
+    return {
+        "unusual_count": int(mask.sum()),
+        "unusual_call_count": int((flagged["type"] == "call").sum()),
+        "unusual_put_count": int((flagged["type"] == "put").sum()),
+        "unusual_contracts": [
+            {
+                "type": row.type,
+                "expiration": row.expiration,
+                "strike": row.strike,
+                "volume": int(row.volume),
+                "open_interest": int(row.open_interest),
+                "vol_oi_ratio": round(float(row.vol_oi_ratio), 2),
+                "z_score": round(float(row.z_score), 2),
+            }
+            for row in top.itertuples(index=False)
+        ],
+    }
+
+
+def _strike_concentration(chain: pd.DataFrame, top_n: int) -> Dict[str, Any]:
+    """按行权价汇总成交量; HHI 越接近 1 越集中"""
+    by_strike = chain.groupby("strike")["volume"].sum()
+    total = by_strike.sum()
+    if total <= 0:
+        return {"strike_hhi": 0.0, "top_strikes": []}
+    
+    share = by_strike / total
+    top = share.nlargest(top_n)
+    return {
+        "strike_hhi": round(float((share.to_numpy() ** 2).sum()), 4),
+        "top_strikes": [
+            {"strike": float(strike), "volume_share": round(float(s), 4)}
+            for strike, s in top.items()
+        ],
+    }
+
+
+def analyze_options_flow(chain: pd.DataFrame, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """期权链 -> 资金流指标 (单次聚合)"""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if chain is None or chain.empty:
+        return {"contracts": 0, "signal": "NEUTRAL", "calls_heavy": False, "call_put_ratio": 0}
+    
+    premium = chain["volume"] * chain["price"] * CONTRACT_MULTIPLIER
+    totals = (
+        chain.assign(premium=premium)
+        .groupby("type")[["volume", "open_interest", "premium"]]
+        .sum()
+        .reindex(["call", "put"], fill_value=0.0)
+    )
+    call, put = totals.loc["call"], totals.loc["put"]
+    
+    total_premium = call["premium"] + put["premium"]
+    net_premium = call["premium"] - put["premium"]
+    net_share = net_premium / total_premium if total_premium > 0 else 0.0
+    
+    threshold = options["flow_threshold"]
+    if net_share >= threshold:
+        signal = "ACCUMULATING"
+    elif net_share <= -threshold:
+        signal = "DISTRIBUTING"
+    else:
+        signal = "NEUTRAL"
+    
+    return {
+        "contracts": int(len(chain)),
+        "expirations": int(chain["expiration"].nunique()),
+        "call_volume": int(call["volume"]),
+        "put_volume": int(put["volume"]),
+        "call_put_ratio": _ratio(call["volume"], put["volume"]),
+        "call_oi": int(call["open_interest"]),
+        "put_oi": int(put["open_interest"]),
+        "oi_call_put_ratio": _ratio(call["open_interest"], put["open_interest"]),
+        "call_premium": round(float(call["premium"]), 2),
+        "put_premium": round(float(put["premium"]), 2),
+        "net_premium": round(float(net_premium), 2),
+        "net_premium_share": round(float(net_share), 4),
+        "calls_heavy": bool(net_premium > 0),
+        "signal": signal,
+        **_unusual_activity(chain, options["unusual_z"], options["min_volume"], options["top_n"]),
+        **_strike_concentration(chain, options["top_n"]),
+    }
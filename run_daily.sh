@@ -5,6 +5,6 @@
 cd /home/mars/.openclaw/workspace/SmarsFA
 
 echo "Starting daily controller run..."
-python3.12 controller/scheduler_v2.py
+python3.12 -m controller.scheduler_v2
 
 echo "Daily run complete!"
@@ -0,0 +1,10 @@
+#!/bin/bash
+# 盘前预热脚本 - 按财报日历预取行情/基本面/期权/SEC filings 到 market_cache 磁盘层
+# 运行时间: 每天 6:00 AM (每日 Controller 7:00 运行, 提前 lead_minutes 由 --wait 控制)
+
+cd /home/mars/.openclaw/workspace/SmarsFA
+
+echo "Starting premarket cache warm-up..."
+python3.12 -m controller.premarket --wait
+
+echo "Premarket warm-up complete!"
@@ -26,6 +26,8 @@ class SubAgentOutput(BaseModel):
     
     # 可观测性
     latency_ms: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
     tokens_used: int = 0
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
 
@@ -49,8 +51,12 @@ class AgentContext(BaseModel):
     trend_signals: Dict[str, Any] = Field(default_factory=dict)
     sentiment_data: Dict[str, Any] = Field(default_factory=dict)
     whale_activity: Dict[str, Any] = Field(default_factory=dict)
+    risk_assessment: Dict[str, Any] = Field(default_factory=dict)
     risk_flags: List[str] = Field(default_factory=list)
     
+    # 配置新增的 SubAgent 写入的 namespace
+    extensions: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    
     # 元数据
     execution_order: List[str] = Field(default_factory=list)
     errors: List[str] = Field(default_factory=list)
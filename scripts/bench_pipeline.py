@@ -0,0 +1,266 @@
+"""
+离线端到端基准 - MasterAgent 全流程 (无网络)
+
+- LLM: MockBackend, 固定延迟 + 可选抖动 (随机种子固定), 回复为各 SubAgent 的 mock_response
+- 行情数据: 替换 tools 的上游拉取函数, 按 --data-latency 延迟返回确定性的假数据
+- 输出: 各阶段/各 SubAgent 耗时, 端到端 p50/p95, 不同并发下的吞吐, 峰值内存 (tracemalloc)
+- 结果写入 JSON, 便于不同版本之间对比
+
+用法:
+    python3.12 scripts/bench_pipeline.py --requests 32 --concurrency 1,4,16 \\
+        --llm-latency 0.8 --llm-jitter 0.4 --data-latency 0.2 --output storage/bench.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tools
+from agents.master_agent import MasterAgent
+from deadline import AnalysisBudget
+from llm import MockBackend
+from market_cache import market_cache
+from options_flow import analyze_options_flow
+
+
+PHASE2 = ("trend", "sentiment", "whale", "risk")
+
+
+class FakeMarketData:
+    """
+    替换 tools 中的上游拉取函数 (market_cache 与 single-flight 仍照常工作)
+    install 后 market_cache 只用内存, 假数据不写入共享的磁盘层
+    """
+    
+    def __init__(self, latency_s: float = 0.0):
+        self.latency = latency_s
+        self.calls = 0
+    
+    def _sleep(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    @staticmethod
+    def _seed(ticker: str) -> int:
+        return sum(ord(c) * 31 ** i for i, c in enumerate(ticker)) % (2 ** 32)
+    
+    def financial_data(self, ticker: str) -> Dict:
+        self._sleep()
+        rng = random.Random(self._seed(ticker))
+        revenue = rng.uniform(5, 150) * 1e9
+        net_income = revenue * rng.uniform(0.05, 0.35)
+        return {
+            "ticker": ticker,
+            "quarter": "2025-12",
+            "source": "fake",
+            "revenue": revenue,
+            "revenue_b": revenue / 1e9,
+            "net_income": net_income,
+            "net_income_b": net_income / 1e9,
+            "market_cap_t": rng.uniform(0.05, 3.5),
+            "pe_ratio": rng.uniform(10, 60),
+            "price": rng.uniform(20, 900),
+            "sec_filings": [{"form": "10-Q", "date": "2026-01-30", "description": f"{ticker} 10-Q"}]
+        }
+    
+    def options_data(self, ticker: str) -> Dict:
+        self._sleep()
+        rng = np.random.default_rng(self._seed(ticker))
+        frames = []
+        for expiration in ("2026-01-16", "2026-02-20", "2026-03-20", "2026-06-18"):
+            for option_type in ("call", "put"):
+                n = 60
+                frames.append(pd.DataFrame({
+                    "type": option_type,
+                    "expiration": expiration,
+                    "strike": np.arange(n) * 5.0 + 50,
+                    "volume": rng.integers(0, 3000, n).astype(float),
+                    "open_interest": rng.integers(1, 20000, n).astype(float),
+                    "price": rng.uniform(0.1, 30, n)
+                }))
+        return {"ticker": ticker, **analyze_options_flow(pd.concat(frames, ignore_index=True))}
+    
+    def sec_filings(self, ticker: str) -> Dict:
+        self._sleep()
+        return {"ticker": ticker, "cik": "", "filings": [], "source": "SEC"}
+    
+    async def sec_filings_async(self, ticker: str) -> Dict:
+        return await asyncio.to_thread(self.sec_filings, ticker)
+    
+    def quote(self, ticker: str) -> Dict:
+        self._sleep()
+        return {"ticker": ticker, "price": 100.0, "prev_close": 99.0, "change_pct": 1.01, "volume": 1e6}
+    
+    def install(self):
+        market_cache.memory_only()
+        tools._fetch_financial_data = self.financial_data
+        tools._fetch_options_data = self.options_data
+        tools._fetch_sec_filings = self.sec_filings
+        tools._fetch_sec_filings_async = self.sec_filings_async
+        tools._fetch_quote = self.quote
+        tools._fetch_quotes_bulk = lambda tickers: {t: self.quote(t) for t in tickers}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    return round(float(np.percentile(values, pct)), 1)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 1) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": round(max(values), 1) if values else 0.0
+    }
+
+
+async def run_one(agent: MasterAgent, stock: str) -> Dict:
+    """单次分析, 从事件流中取各 SubAgent 完成时刻与自身耗时"""
+    start = time.perf_counter()
+    done_at, latency, errors = {}, {}, []
+    async for event in agent.analyze_stream(stock, "Q4 2025"):
+        if event["event"] != "subagent":
+            continue
+        data = event["data"]
+        done_at[data["agent"]] = data["elapsed_ms"]
+        latency[data["agent"]] = data.get("latency_ms") or 0
+        if data["result"].get("error"):
+            errors.append(f"{data['agent']}: {data['result']['error']}")
+    total_ms = (time.perf_counter() - start) * 1000
+    
+    parsing_end = done_at.get("parsing", 0)
+    phase2_end = max([done_at.get(name, parsing_end) for name in PHASE2] + [parsing_end])
+    return {
+        "total_ms": total_ms,
+        "phases": {
+            "parsing": parsing_end,
+            "parallel": phase2_end - parsing_end,
+            "synthesis": done_at.get("synthesis", phase2_end) - phase2_end
+        },
+        "agents": latency,
+        "errors": errors
+    }
+
+
+async def run_level(agent: MasterAgent, requests: int, concurrency: int, warm: bool) -> Dict:
+    if not warm:
+        market_cache.invalidate()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def limited(i: int):
+        async with semaphore:
+            return await run_one(agent, f"B{i:04d}")
+    
+    tracemalloc.start()
+    start = time.perf_counter()
+    runs = await asyncio.gather(*(limited(i) for i in range(requests)))
+    wall_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    agents = sorted({name for run in runs for name in run["agents"]})
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_s": round(wall_s, 3),
+        "throughput_per_min": round(requests / wall_s * 60, 1),
+        "end_to_end_ms": summarize([run["total_ms"] for run in runs]),
+        "phases_ms": {
+            phase: summarize([run["phases"][phase] for run in runs])
+            for phase in ("parsing", "parallel", "synthesis")
+        },
+        "agents_ms": {
+            name: summarize([run["agents"][name] for run in runs if name in run["agents"]])
+            for name in agents
+        },
+        "errors": sum(len(run["errors"]) for run in runs),
+        "error_samples": [e for run in runs for e in run["errors"]][:5],
+        "peak_memory_mb": round(peak / 1024 / 1024, 2)
+    }
+
+
+def print_level(level: Dict, budget_ms: int):
+    e2e = level["end_to_end_ms"]
+    print(f"\n[concurrency={level['concurrency']}] {level['requests']} requests in {level['wall_s']}s "
+          f"({level['throughput_per_min']}/min), peak {level['peak_memory_mb']}MB, errors {level['errors']}")
+    print(f"  end-to-end  p50 {e2e['p50']}ms  p95 {e2e['p95']}ms  "
+          f"({'within' if e2e['p95'] <= budget_ms else 'OVER'} {budget_ms}ms budget)")
+    for phase, stats in level["phases_ms"].items():
+        print(f"  phase {phase:<10} p50 {stats['p50']}ms  p95 {stats['p95']}ms")
+    for name, stats in level["agents_ms"].items():
+        print(f"  agent {name:<10} p50 {stats['p50']}ms  p95 {stats['p95']}ms")
+
+
+async def main(args) -> int:
+    random.seed(args.seed)
+    FakeMarketData(args.data_latency).install()
+    backend = MockBackend(latency_s=args.llm_latency, jitter_s=args.llm_jitter,
+                          max_concurrency=args.llm_concurrency)
+    # 关闭增量复用: 各并发级别重复分析相同 ticker, 需每次全量执行
+    agent = MasterAgent(llm=backend, incremental=False)
+    budget_ms = AnalysisBudget().budget_ms
+    
+    levels = []
+    for concurrency in args.concurrency:
+        # MasterAgent 的阶段日志很多, 基准运行期间屏蔽
+        with redirect_stdout(io.StringIO()):
+            level = await run_level(agent, args.requests, concurrency, args.warm)
+        print_level(level, budget_ms)
+        levels.append(level)
+    
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "llm_latency_s": args.llm_latency,
+            "llm_jitter_s": args.llm_jitter,
+            "llm_concurrency": args.llm_concurrency,
+            "data_latency_s": args.data_latency,
+            "warm_cache": args.warm,
+            "seed": args.seed,
+            "budget_ms": budget_ms
+        },
+        "levels": levels
+    }
+    
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline MasterAgent pipeline benchmark")
+    parser.add_argument("--requests", type=int, default=16, help="每个并发级别的分析次数")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="假 LLM 固定延迟 (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.4, help="假 LLM 额外随机延迟上限 (s)")
+    parser.add_argument("--llm-concurrency", type=int, default=64, help="假 LLM 后端并发上限")
+    parser.add_argument("--data-latency", type=float, default=0.2, help="假行情数据源延迟 (s)")
+    parser.add_argument("--warm", action="store_true", help="不清空行情缓存 (测缓存命中路径)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="./storage/bench_pipeline.json")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,71 @@
+"""
+Prompt 大小报告 - 各 SubAgent 上下文: 旧版 dict repr vs prompt_context 紧凑序列化
+
+离线运行一次完整分析 (MockBackend + bench_pipeline 的假行情数据), 用最终的
+WorkingMemory 构建各 SubAgent 的 prompt 并对比大小。
+
+用法:
+    python3.12 scripts/prompt_size.py --stocks NVDA,AAPL --json
+"""
+import io
+import os
+import sys
+import json
+import asyncio
+import argparse
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.master_agent import MasterAgent
+from llm import MockBackend
+from tokens import count_tokens, tokenizer_name
+from bench_pipeline import FakeMarketData
+
+
+def report(agent: MasterAgent, memory: Dict) -> Dict[str, Dict]:
+    rows = {}
+    for name, subagent in agent.subagents.items():
+        if not subagent.uses_llm:
+            continue
+        rows[name] = {
+            **subagent.prompt_size(memory),
+            "prompt_tokens": count_tokens(subagent.build_prompt(memory))
+        }
+    return rows
+
+
+async def main(args) -> int:
+    FakeMarketData().install()
+    agent = MasterAgent(llm=MockBackend(), incremental=False)
+    
+    results = {}
+    for stock in args.stocks:
+        with redirect_stdout(io.StringIO()):
+            final = await agent.analyze_async(stock, args.quarter)
+        results[stock] = report(agent, final["memory"])
+    
+    if args.json:
+        print(json.dumps({"tokenizer": tokenizer_name(), "stocks": results}, indent=2))
+        return 0
+    
+    print(f"tokenizer: {tokenizer_name()}")
+    for stock, rows in results.items():
+        print(f"\n[{stock}]  context tokens: raw -> compact (saved), full prompt tokens")
+        for name, row in rows.items():
+            print(f"  {name:<10} {row['raw_tokens']:>6} -> {row['compact_tokens']:<6} "
+                  f"({row['saved_pct']}%)  prompt {row['prompt_tokens']}")
+        total_raw = sum(row["raw_tokens"] for row in rows.values())
+        total_compact = sum(row["compact_tokens"] for row in rows.values())
+        print(f"  {'total':<10} {total_raw:>6} -> {total_compact}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sub-agent prompt size report")
+    parser.add_argument("--stocks", type=lambda s: [x.strip().upper() for x in s.split(",")],
+                        default=["NVDA"])
+    parser.add_argument("--quarter", default="Q4 2025")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
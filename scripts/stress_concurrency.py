@@ -0,0 +1,89 @@
+"""
+并发压力测试 - 同一个 MasterAgent 实例同时分析多只股票
+
+用 MockBackend (随机延迟, 把 prompt 中的 revenue_b 回显到输出) 打乱各分析的完成顺序,
+然后逐个检查: 每只股票的 memory / SubAgent 输出 / Synthesis 结果都只包含自己的数据。
+
+用法:
+    python3.12 scripts/stress_concurrency.py --tickers 50
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.master_agent import MasterAgent
+from llm import MockBackend
+
+
+REVENUE_PATTERN = re.compile(r"revenue_b=([0-9.]+)")
+
+
+def echo_revenue(prompt: str) -> str:
+    match = REVENUE_PATTERN.search(prompt)
+    echo = float(match.group(1)) if match else None
+    return json.dumps({
+        "confidence": 0.8,
+        "key_findings": [],
+        "structured_data": {"echo_revenue_b": echo, "recommendation": "HOLD"},
+        "risk_flags": []
+    })
+
+
+def check(index: int, result: dict) -> list:
+    """返回该结果中的串扰错误"""
+    stock = f"T{index:03d}"
+    expected = float(index)
+    memory = result.get("memory", {})
+    errors = []
+    
+    if result.get("stock") != stock or memory.get("stock") != stock:
+        errors.append(f"{stock}: stock mismatch ({memory.get('stock')})")
+    if memory.get("financial_metrics", {}).get("revenue_b") != expected:
+        errors.append(f"{stock}: financial_metrics from another ticker")
+    for namespace in ("trend_signals", "sentiment_data"):
+        if memory.get(namespace, {}).get("echo_revenue_b") != expected:
+            errors.append(f"{stock}: {namespace} saw {memory.get(namespace)}")
+    if result.get("result", {}).get("structured_data", {}).get("echo_revenue_b") != expected:
+        errors.append(f"{stock}: synthesis saw another ticker's context")
+    
+    return errors
+
+
+async def main(tickers: int, max_delay: float) -> int:
+    backend = MockBackend(jitter_s=max_delay, responder=echo_revenue, max_concurrency=tickers * 6)
+    agent = MasterAgent(llm=backend, incremental=False)
+    
+    start = time.time()
+    results = await asyncio.gather(*[
+        agent.analyze_async(f"T{i:03d}", actual_data={"revenue": i * 1e9, "eps": 1.0})
+        for i in range(1, tickers + 1)
+    ])
+    elapsed = time.time() - start
+    
+    errors = []
+    for i, result in enumerate(results, 1):
+        errors.extend(check(i, result))
+    
+    print(f"\n{'='*60}")
+    print(f"Concurrent analyses: {tickers}, wall time: {elapsed:.2f}s")
+    if errors:
+        print(f"FAILED: {len(errors)} cross-talk errors")
+        for e in errors[:20]:
+            print(f"  ❌ {e}")
+        return 1
+    print("OK: every analysis saw only its own context")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MasterAgent concurrency stress test")
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--max-delay", type=float, default=0.05, help="fake LLM max latency (s)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.tickers, args.max_delay)))
@@ -0,0 +1,127 @@
+"""
+Tokens - token 计数与 token 预算
+- 计数: 安装了 tiktoken 时按真实分词器计数, 否则按字符估算 (中文约 1 字 1 token, 其余约 4 字符 1 token)
+- TokenBudget: 单次分析 / 整个批量的 token 上限, 子预算扣减时同时扣减父预算
+"""
+import math
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from config import load_agent_config
+from metrics import REGISTRY
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+DEFAULT_ENCODING = "cl100k_base"
+DEFAULT_COMPLETION_ESTIMATE = 600  # 未调用前预估的单次回复 token 数
+
+TOKENS_TOTAL = REGISTRY.counter(
+    "smarsfa_llm_tokens_total", "LLM tokens by sub-agent and type (prompt/completion)", labels=("agent", "type")
+)
+
+
+def load_token_config() -> Dict[str, Any]:
+    """agent_config.yaml -> agents.tokens"""
+    return load_agent_config().get("agents", {}).get("tokens", {}) or {}
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # 编码文件需联网下载, 离线环境退回估算
+        print(f"[Tokens] tiktoken encoding {name} unavailable ({e}), using estimate")
+        return None
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0x3000 <= code <= 0x303F
+            or 0xFF00 <= code <= 0xFFEF or 0xF900 <= code <= 0xFAFF)
+
+
+def estimate_tokens(text: str) -> int:
+    """无分词器时的估算: CJK 字符各算 1 token, 其余非空白字符每 4 个算 1 token"""
+    cjk = other = 0
+    for char in text:
+        if _is_cjk(char):
+            cjk += 1
+        elif not char.isspace():
+            other += 1
+    return cjk + math.ceil(other / 4)
+
+
+def tokenizer_name() -> str:
+    encoding = _encoding(load_token_config().get("encoding", DEFAULT_ENCODING))
+    return f"tiktoken:{encoding.name}" if encoding is not None else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding(load_token_config().get("encoding", DEFAULT_ENCODING))
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def completion_estimate() -> int:
+    return load_token_config().get("completion_estimate", DEFAULT_COMPLETION_ESTIMATE)
+
+
+class TokenBudget:
+    """
+    token 预算 (线程安全); limit 为空或 0 表示不限
+    remaining() 同时受父预算约束, charge() 同时计入父预算
+    """
+    
+    def __init__(self, limit: Optional[int] = None, parent: Optional["TokenBudget"] = None):
+        self.limit = limit or None
+        self.parent = parent
+        self.used = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_analysis(cls, parent: Optional["TokenBudget"] = None) -> "TokenBudget":
+        return cls(load_token_config().get("analysis_budget"), parent=parent)
+    
+    @classmethod
+    def for_batch(cls, limit: Optional[int] = None) -> "TokenBudget":
+        return cls(limit if limit is not None else load_token_config().get("batch_budget"))
+    
+    def remaining(self) -> float:
+        with self._lock:
+            own = math.inf if self.limit is None else max(self.limit - self.used, 0)
+        if self.parent is not None:
+            own = min(own, self.parent.remaining())
+        return own
+    
+    def limited(self) -> bool:
+        return self.remaining() != math.inf
+    
+    def fits(self, tokens: int) -> bool:
+        return tokens <= self.remaining()
+    
+    def charge(self, tokens: int):
+        if not tokens:
+            return
+        with self._lock:
+            self.used += tokens
+        if self.parent is not None:
+            self.parent.charge(tokens)
+    
+    def describe(self) -> Dict[str, Any]:
+        remaining = self.remaining()
+        return {
+            "limit": self.limit,
+            "used": self.used,
+            "remaining": None if remaining == math.inf else int(remaining)
+        }
@@ -1,11 +1,16 @@
 """
 Tools - 多数据源财务获取 (SEC + RSS)
+所有数据经 market_cache 缓存 (按数据集 TTL + single-flight)
 """
 import yfinance as yf
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Iterable
 import time
-import requests
-import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from market_cache import market_cache, load_data_config
+from options_flow import load_option_chain, analyze_options_flow
+from http_client import sec_client
 
 
 # SEC CIK映射
@@ -20,48 +25,66 @@ CIK_MAP = {
 }
 
 
-def get_sec_filings(ticker: str) -> Dict[str, Any]:
-    """从SEC获取最新财报"""
+SEC_SEARCH_PATH = "/LATEST/search-index"
+
+
+def _sec_params(ticker: str) -> Dict[str, Any]:
+    return {
+        "q": ticker,
+        "dateRange": "custom",
+        "startdt": "2026-01-01",
+        "enddt": "2026-12-31",
+        "forms": "10-K,10-Q,8-K"
+    }
+
+
+def _parse_sec_filings(ticker: str, cik: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    hits = data.get("hits", {}).get("hits", [])
+    filings = []
+    
+    for h in hits[:5]:
+        source = h.get("_source", {})
+        filings.append({
+            "form": source.get("form", ""),
+            "date": source.get("filingDate", ""),
+            "description": source.get("displayName", "")
+        })
+    
+    return {
+        "ticker": ticker,
+        "cik": cik,
+        "filings": filings,
+        "source": "SEC"
+    }
+
+
+def _fetch_sec_filings(ticker: str) -> Dict[str, Any]:
+    """从SEC获取最新财报 (共享连接池 + 限流 + 重试)"""
     cik = CIK_MAP.get(ticker.upper())
     if not cik:
         return {"error": f"No CIK for {ticker}"}
     
     try:
-        url = f"https://efts.sec.gov/LATEST/search-index"
-        params = {
-            "q": ticker,
-            "dateRange": "custom",
-            "startdt": "2026-01-01",
-            "enddt": "2026-12-31",
-            "forms": "10-K,10-Q,8-K"
-        }
-        
-        headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(url, params=params, headers=headers, timeout=10)
-        data = resp.json()
-        
-        hits = data.get("hits", {}).get("hits", [])
-        filings = []
-        
-        for h in hits[:5]:
-            source = h.get("_source", {})
-            filings.append({
-                "form": source.get("form", ""),
-                "date": source.get("filingDate", ""),
-                "description": source.get("displayName", "")
-            })
-        
-        return {
-            "ticker": ticker,
-            "cik": cik,
-            "filings": filings,
-            "source": "SEC"
-        }
+        resp = sec_client.get(SEC_SEARCH_PATH, params=_sec_params(ticker))
+        return _parse_sec_filings(ticker, cik, resp.json())
     except Exception as e:
         return {"ticker": ticker, "error": str(e)}
 
 
-def get_financial_data(ticker: str) -> Dict[str, Any]:
+async def _fetch_sec_filings_async(ticker: str) -> Dict[str, Any]:
+    """异步从SEC获取最新财报"""
+    cik = CIK_MAP.get(ticker.upper())
+    if not cik:
+        return {"error": f"No CIK for {ticker}"}
+    
+    try:
+        resp = await sec_client.get_async(SEC_SEARCH_PATH, params=_sec_params(ticker))
+        return _parse_sec_filings(ticker, cik, resp.json())
+    except Exception as e:
+        return {"ticker": ticker, "error": str(e)}
+
+
+def _fetch_financial_data(ticker: str) -> Dict[str, Any]:
     """获取财务数据 - 优先SEC"""
     try:
         # 先尝试SEC
@@ -102,30 +125,180 @@ def get_financial_data(ticker: str) -> Dict[str, Any]:
         return {"ticker": ticker, "error": str(e)}
 
 
-def get_options_data(ticker: str) -> Dict[str, Any]:
-    """获取期权数据"""
+def _options_config() -> Dict[str, Any]:
+    return load_data_config().get("market_data", {}).get("options", {}) or {}
+
+
+def _fetch_options_data(ticker: str) -> Dict[str, Any]:
+    """获取期权数据 - 全部到期日的资金流分析 (options_flow)"""
     try:
-        stock = yf.Ticker(ticker)
-        options = stock.option_chain()
-        
-        calls = options.calls.to_dict() if hasattr(options, 'calls') else {}
-        puts = options.puts.to_dict() if hasattr(options, 'puts') else {}
-        
-        call_vol = sum(calls.get('volume', [0])) if calls else 0
-        put_vol = sum(puts.get('volume', [0])) if puts else 0
-        
-        return {
-            "ticker": ticker,
-            "call_volume": call_vol,
-            "put_volume": put_vol,
-            "call_put_ratio": round(call_vol / put_vol, 2) if put_vol > 0 else 0,
-        }
+        options = _options_config()
+        chain = load_option_chain(
+            yf.Ticker(ticker),
+            max_expirations=options.get("max_expirations", 12),
+            max_workers=options.get("max_workers", 6)
+        )
+        return {"ticker": ticker, **analyze_options_flow(chain, options)}
+    except Exception as e:
+        return {"ticker": ticker, "error": str(e)}
+
+
+def _fetch_quotes_bulk(tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+    """批量获取报价 - 一次 yf.download 请求覆盖所有 ticker"""
+    frame = yf.download(
+        tickers, period="5d", interval="1d", group_by="ticker",
+        threads=True, progress=False, auto_adjust=False
+    )
+    quotes = {}
+    if frame is None or frame.empty:
+        return quotes
+    
+    for ticker in tickers:
+        try:
+            data = frame[ticker] if ticker in frame.columns.get_level_values(0) else frame
+            closes = data["Close"].dropna()
+            if closes.empty:
+                continue
+            price = float(closes.iloc[-1])
+            prev = float(closes.iloc[-2]) if len(closes) > 1 else price
+            quotes[ticker] = {
+                "ticker": ticker,
+                "price": price,
+                "prev_close": prev,
+                "change_pct": round((price / prev - 1) * 100, 2) if prev else 0,
+                "volume": float(data["Volume"].dropna().iloc[-1]) if "Volume" in data else 0,
+                "as_of": str(closes.index[-1])[:10],
+                "source": "yfinance"
+            }
+        except (KeyError, IndexError, ValueError):
+            continue
+    return quotes
+
+
+def _fetch_quote(ticker: str) -> Dict[str, Any]:
+    try:
+        return _fetch_quotes_bulk([ticker]).get(ticker) or {"ticker": ticker, "error": "no quote"}
     except Exception as e:
         return {"ticker": ticker, "error": str(e)}
 
 
+# ========== Cached ==========
+
+def get_sec_filings(ticker: str) -> Dict[str, Any]:
+    """从SEC获取最新财报 (缓存)"""
+    return market_cache.get_or_fetch("filings", ticker, lambda: _fetch_sec_filings(ticker))
+
+
+def get_financial_data(ticker: str) -> Dict[str, Any]:
+    """获取财务数据 (缓存)"""
+    return market_cache.get_or_fetch("fundamentals", ticker, lambda: _fetch_financial_data(ticker))
+
+
+def get_options_data(ticker: str) -> Dict[str, Any]:
+    """获取期权数据 (缓存)"""
+    return market_cache.get_or_fetch("options", ticker, lambda: _fetch_options_data(ticker))
+
+
+def get_quote(ticker: str) -> Dict[str, Any]:
+    """获取最新报价 (缓存)"""
+    return market_cache.get_or_fetch("quote", ticker, lambda: _fetch_quote(ticker))
+
+
+# ========== Bulk ==========
+
+PREFETCH_DATASETS = ("quote", "fundamentals", "options")
+
+
+def prefetch_market_data(tickers: Iterable[str], datasets: Iterable[str] = PREFETCH_DATASETS,
+                         max_workers: int = 8) -> Dict[str, Any]:
+    """
+    批量预取 - 分析开始前一次性拉取整个列表的数据写入 market_cache
+    - quote: 一次批量请求
+    - fundamentals/options: yfinance 无批量接口, 线程池并发拉取
+    已在缓存中的 (数据集, ticker) 跳过; 单个失败不影响其它
+    """
+    start = time.time()
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    datasets = list(datasets)
+    report = {ds: {"warm": 0, "fetched": 0, "failed": 0} for ds in datasets}
+    
+    def pending(dataset):
+        cold = [t for t in tickers if not market_cache.contains(dataset, t)]
+        report[dataset]["warm"] = len(tickers) - len(cold)
+        return cold
+    
+    if "quote" in datasets:
+        cold = pending("quote")
+        if cold:
+            try:
+                quotes = _fetch_quotes_bulk(cold)
+            except Exception:
+                quotes = {}
+            for ticker in cold:
+                if ticker in quotes:
+                    market_cache.put("quote", ticker, quotes[ticker])
+                    report["quote"]["fetched"] += 1
+                else:
+                    report["quote"]["failed"] += 1
+    
+    fetchers = {"fundamentals": get_financial_data, "options": get_options_data, "filings": get_sec_filings}
+    jobs = [(ds, t) for ds in datasets if ds in fetchers for t in pending(ds)]
+    if jobs:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda job: fetchers[job[0]](job[1]), jobs)
+            for (dataset, _), result in zip(jobs, results):
+                key = "failed" if result.get("error") else "fetched"
+                report[dataset][key] += 1
+    
+    return {
+        "tickers": len(tickers),
+        "datasets": report,
+        "elapsed_ms": int((time.time() - start) * 1000)
+    }
+
+
+# ========== Async ==========
+# yfinance/requests 均为阻塞 I/O, 未命中缓存时放到线程池执行, 不占用事件循环
+
+async def get_sec_filings_async(ticker: str) -> Dict[str, Any]:
+    """异步获取SEC财报"""
+    return await market_cache.get_or_fetch_async(
+        "filings", ticker, lambda: _fetch_sec_filings(ticker),
+        fetch_async=lambda: _fetch_sec_filings_async(ticker)
+    )
+
+
+async def get_financial_data_async(ticker: str) -> Dict[str, Any]:
+    """异步获取财务数据"""
+    return await market_cache.get_or_fetch_async("fundamentals", ticker, lambda: _fetch_financial_data(ticker))
+
+
+async def get_options_data_async(ticker: str) -> Dict[str, Any]:
+    """异步获取期权数据"""
+    return await market_cache.get_or_fetch_async("options", ticker, lambda: _fetch_options_data(ticker))
+
+
+async def get_quote_async(ticker: str) -> Dict[str, Any]:
+    """异步获取报价"""
+    return await market_cache.get_or_fetch_async("quote", ticker, lambda: _fetch_quote(ticker))
+
+
+async def prefetch_market_data_async(tickers: Iterable[str], datasets: Iterable[str] = PREFETCH_DATASETS,
+                                     max_workers: int = 8) -> Dict[str, Any]:
+    """异步批量预取"""
+    return await asyncio.to_thread(prefetch_market_data, list(tickers), list(datasets), max_workers)
+
+
 TOOLS = {
     "get_financial_data": get_financial_data,
     "get_options_data": get_options_data,
     "get_sec_filings": get_sec_filings,
+    "get_quote": get_quote,
+}
+
+ASYNC_TOOLS = {
+    "get_financial_data": get_financial_data_async,
+    "get_options_data": get_options_data_async,
+    "get_sec_filings": get_sec_filings_async,
+    "get_quote": get_quote_async,
 }
@@ -0,0 +1,144 @@
+"""
+Tracing - 结构化 span (contextvars)
+- trace_id 随 contextvars 传递: asyncio task、asyncio.to_thread 自动继承
+- span: analyze / phase / subagent / llm / fetch, 记录耗时与状态 (ok/error/timeout)
+- 每个 span 同时写入指标 (耗时直方图 + 计数), 并保存在最近 span 环形缓冲区中可按 trace_id 查询
+"""
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from metrics import REGISTRY
+
+
+TRACE_HEADER = "X-Trace-Id"
+MAX_RECENT_SPANS = 5000
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_span_id: ContextVar[Optional[str]] = ContextVar("span_id", default=None)
+
+_recent: deque = deque(maxlen=MAX_RECENT_SPANS)
+_recent_lock = threading.Lock()
+
+SPAN_SECONDS = REGISTRY.histogram(
+    "smarsfa_span_duration_seconds", "Span latency by kind and name", labels=("kind", "name")
+)
+SPAN_TOTAL = REGISTRY.counter(
+    "smarsfa_spans_total", "Finished spans by kind, name and status", labels=("kind", "name", "status")
+)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace_context(trace_id: Optional[str] = None):
+    """设置当前 trace_id (未传入时沿用已有的, 都没有时新建)"""
+    trace_id = trace_id or _trace_id.get() or new_trace_id()
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+class Span:
+    """
+    with span("trend", kind="subagent", stock="NVDA") as s:
+        ...
+        s.set_status("timeout")
+    异常退出时状态为 error
+    """
+    
+    def __init__(self, name: str, kind: str = "internal", **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.status = "ok"
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = None
+        self.parent_id = None
+        self._start = 0.0
+        self._token = None
+    
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+    
+    def set_status(self, status: str):
+        self.status = status
+    
+    def __enter__(self) -> "Span":
+        self.trace_id = _trace_id.get()
+        self.parent_id = _span_id.get()
+        self._token = _span_id.set(self.span_id)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _span_id.reset(self._token)
+        if exc_type is not None and self.status == "ok":
+            self.status = "error"
+            self.attributes["error"] = str(exc)
+        _finish(self, duration)
+        return False
+    
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def span(name: str, kind: str = "internal", **attributes) -> Span:
+    return Span(name, kind, **attributes)
+
+
+def record_span(name: str, kind: str, started: float, status: str = "ok", **attributes):
+    """
+    事后记录 span (started 为 time.perf_counter())
+    用于跨 yield 的区间 (如 analyze_stream 的各阶段), 避免在生成器中切换 contextvars
+    """
+    s = Span(name, kind, **attributes)
+    s.trace_id = _trace_id.get()
+    s.parent_id = _span_id.get()
+    s.status = status
+    duration = time.perf_counter() - started
+    s.started_at = time.time() - duration
+    _finish(s, duration)
+
+
+def _finish(s: Span, duration: float):
+    SPAN_SECONDS.observe(duration, kind=s.kind, name=s.name)
+    SPAN_TOTAL.inc(kind=s.kind, name=s.name, status=s.status)
+    record = {
+        "trace_id": s.trace_id,
+        "span_id": s.span_id,
+        "parent_id": s.parent_id,
+        "kind": s.kind,
+        "name": s.name,
+        "status": s.status,
+        "start": datetime.fromtimestamp(s.started_at).isoformat(),
+        "duration_ms": round(duration * 1000, 2),
+        "attributes": s.attributes
+    }
+    with _recent_lock:
+        _recent.append(record)
+
+
+def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """最近缓冲区中某个 trace 的全部 span (按开始时间)"""
+    with _recent_lock:
+        spans = [s for s in _recent if s["trace_id"] == trace_id]
+    return sorted(spans, key=lambda s: s["start"])